@@ -1,8 +1,11 @@
+import logging
+
 import numpy
 
 import nanovna
 import time
 
+logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
 vna = nanovna.NanoVNA()
 
 
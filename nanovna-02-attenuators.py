@@ -1,10 +1,12 @@
+import logging
 import nanovna
 import time
 
 DIR = 'nanovna-02'
 PREFIX = 'attenuators-straight'
+logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
 vna = nanovna.NanoVNA()
-vna.set_marker(1, 73)  # index 73 is 446MHz with 101 points
+vna.set_marker(1, vna.index_of(446e6))
 
 
 def polar():
@@ -48,5 +50,6 @@ def test():
 #smith()
 #swr()
 #test()
-arr1 = vna.get_data(0)
-arr2 = vna.get_data(1)
+acquisition = vna.acquire((0, 1))  # both arrays from the same sweep
+arr1 = acquisition.data[0]
+arr2 = acquisition.data[1]
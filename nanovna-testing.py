@@ -7,19 +7,17 @@ import nanovna
 
 DIR = 'nanovna-testing'
 PREFIX = 'testing'
-vna = nanovna.NanoVNA(loglevel=logging.DEBUG)
+logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.DEBUG)
+vna = nanovna.NanoVNA()
 
 
 # On device reset, the buffer has multiple prompts and 'NanoVNA Shell' text in it
 def reset_testing():
-    vna._open()
-    print(f'lines: {vna._read_lines()}')
-    print(f'lines: {vna._read_lines()}')
-    print(f'lines: {vna._read_lines()}')
+    print(f'device was reset: {vna.resync()}')
 
 
 def pause_resume_test():
-    vna.set_marker(1, 73)  # index 73 is 446MHz with 101 points
+    vna.set_marker(1, vna.index_of(446e6))
     vna.pause()
     time.sleep(2)
     vna.resume()
@@ -44,7 +42,7 @@ def snapshot_test():
     vna.set_trace(1, 'linear', 0)
     vna.set_trace(2, 'real', 0)
     vna.set_trace(3, 'imag', 0)
-    vna.set_marker(1, 73)
+    vna.set_marker(1, vna.index_of(446e6))
 
     start, stop, points = vna.get_sweep()
     vna.set_scan(start, stop, points)
@@ -61,12 +59,12 @@ def snapshot_test():
 #capture = vna.capture()
 #capture.save(f'{DIR}/{PREFIX}-smith.png', 'PNG')
 #vna.set_sweep(300e6, 500e6, 101)
-#vna.set_marker(1, 73)
+#vna.set_marker(1, vna.index_of(446e6))
 #full_pull()
 #snapshot_test()
 
 measurements = nanovna.Measurements(vna, DIR, PREFIX)
-vna.set_marker(1, 73)
+vna.set_marker(1, vna.index_of(446e6))
 measurements.polar()
 measurements.smith()
 measurements.swr()
@@ -1,2 +1,36 @@
-from .device import *
-from .measurements import *
+# The classes are imported from their modules on first access, so that importing the package, or running the CLI,
+# doesn't pull in numpy, pyserial, PIL and asyncio before they are needed.
+
+import importlib
+
+_EXPORTS = {
+    'NanoVNA': 'device',
+    'Acquisition': 'device',
+    'Batch': 'device',
+    'CommandError': 'device',
+    'Measurements': 'measurements',
+    'AsyncNanoVNA': 'aio',
+    'AsyncBatch': 'aio',
+    'DevicePool': 'pool',
+    'PoolResult': 'pool',
+    'SweepRecorder': 'recorder',
+    'Recording': 'recorder',
+    'Instrumentation': 'instrumentation',
+    'Catalogue': 'catalogue',
+    'SweepAccumulator': 'averaging',
+    'Renderer': 'plotting',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
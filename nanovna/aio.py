@@ -0,0 +1,154 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .device import Batch, NanoVNA
+
+
+class AsyncNanoVNA:
+    """
+    asyncio counterpart of NanoVNA. There is a single protocol implementation, the blocking NanoVNA, and every call
+    goes through one command queue served by one worker thread. Calls from several coroutines are executed one at
+    a time in the order they were awaited, so their commands and prompts never interleave on the wire.
+
+    Use run() for sequences that must not be split by other coroutines, like pause, data and resume.
+
+    After close() the worker thread is started again by the next call, and the device reopened like NanoVNA does.
+    """
+
+    def __init__(self, vna: NanoVNA = None, **kwargs):
+        """
+        :param vna: Blocking NanoVNA to drive, created with kwargs when omitted
+        """
+        self.vna = vna or NanoVNA(**kwargs)
+        self._executor = None
+        self._queue = None
+        self._worker = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            function, args, kwargs, future = await self._queue.get()
+            try:
+                if not future.cancelled():
+                    result = await loop.run_in_executor(self._executor, lambda: function(*args, **kwargs))
+                    if not future.cancelled():
+                        future.set_result(result)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _call(self, function, *args, **kwargs):
+        if self._worker is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nanovna')
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._work())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((function, args, kwargs, future))
+        return await future
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs function(vna, *args, **kwargs) as one entry in the command queue.
+        """
+        return await self._call(function, self.vna, *args, **kwargs)
+
+    async def close(self):
+        if self._worker is not None:
+            await self._queue.join()
+            self._worker.cancel()
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.vna._close()
+
+    def batch(self) -> 'AsyncBatch':
+        """
+        Like NanoVNA.batch, the commands are sent as one entry in the command queue when the block ends:
+
+            async with avna.batch() as batch:
+                batch.set_trace(0, 'polar', 0)
+        """
+        return AsyncBatch(self)
+
+    async def ping(self):
+        return await self._call(self.vna.ping)
+
+    async def settle(self, array=0, **kwargs):
+        return await self._call(self.vna.settle, array, **kwargs)
+
+    async def set_marker(self, n: int, index):
+        return await self._call(self.vna.set_marker, n, index)
+
+    async def set_trace(self, trace, trace_format, channel):
+        return await self._call(self.vna.set_trace, trace, trace_format, channel)
+
+    async def pause(self):
+        return await self._call(self.vna.pause)
+
+    async def resume(self):
+        return await self._call(self.vna.resume)
+
+    async def get_frequencies(self, out=None):
+        return await self._call(self.vna.get_frequencies, out)
+
+    async def capture(self, raw=False):
+        return await self._call(self.vna.capture, raw)
+
+    async def get_data(self, array=0, out=None, **kwargs):
+        return await self._call(self.vna.get_data, array, out, **kwargs)
+
+    async def get_info(self):
+        return await self._call(self.vna.get_info)
+
+    async def get_sweep(self):
+        return await self._call(self.vna.get_sweep)
+
+    async def set_calibration(self, enabled: bool):
+        return await self._call(self.vna.set_calibration, enabled)
+
+    async def set_sweep(self, start, stop, points):
+        return await self._call(self.vna.set_sweep, start, stop, points)
+
+    async def set_scan(self, start, stop, points):
+        return await self._call(self.vna.set_scan, start, stop, points)
+
+    async def scan(self, start, stop, points, **kwargs):
+        return await self._call(self.vna.scan, start, stop, points, **kwargs)
+
+    async def acquire(self, arrays=(0, 1), **kwargs):
+        return await self._call(self.vna.acquire, arrays, **kwargs)
+
+
+class AsyncBatch:
+    """
+    Batch of AsyncNanoVNA. The commands are collected without waiting, only the execution is awaited.
+    """
+
+    def __init__(self, avna: AsyncNanoVNA):
+        self._avna = avna
+        self.batch = Batch(avna.vna)
+
+    def __getattr__(self, name):
+        return getattr(self.batch, name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc):
+        if exc_type is None:
+            await self.execute()
+        else:
+            self.batch.__exit__(exc_type, *exc)
+
+    async def execute(self) -> [[str]]:
+        return await self._avna._call(self.batch.execute)
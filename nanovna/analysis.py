@@ -0,0 +1,93 @@
+# Derived quantities of the measured S-parameters, as in NanoVNAPlotting of nanovna_original.py but without plotting.
+# Every function takes an array of complex points, or a 2-D array of sweeps x points, and works along the last axis,
+# so a whole recording is analysed in one call. The frequencies are a 1-D array matching the last axis.
+
+import numpy as np
+
+Z0 = 50
+
+
+def linmag(x) -> np.array:
+    return np.abs(x)
+
+
+def logmag(x) -> np.array:
+    return 20 * np.log10(np.abs(x))
+
+
+def phase(x, unwrap=False, deg=True) -> np.array:
+    a = np.angle(x)
+    if unwrap:
+        a = np.unwrap(a, axis=-1)
+    return np.rad2deg(a) if deg else a
+
+
+def delay(x, frequencies) -> np.array:
+    """
+    Phase delay in seconds.
+    """
+    return -np.unwrap(np.angle(x), axis=-1) / (2 * np.pi * np.asarray(frequencies))
+
+
+def groupdelay(x, frequencies) -> np.array:
+    """
+    Group delay in seconds, the derivative of the unwrapped phase over the angular frequency.
+    """
+    omega = 2 * np.pi * np.asarray(frequencies, dtype=np.float64)
+    return -np.gradient(np.unwrap(np.angle(x), axis=-1), omega, axis=-1)
+
+
+def vswr(x) -> np.array:
+    m = np.abs(x)
+    return (1 + m) / (1 - m)
+
+
+def return_loss(x) -> np.array:
+    """
+    Return loss in dB, positive for a passive load.
+    """
+    return -20 * np.log10(np.abs(x))
+
+
+def mismatch_loss(x) -> np.array:
+    """
+    Power lost to the reflection in dB.
+    """
+    return -10 * np.log10(1 - np.abs(x) ** 2)
+
+
+def impedance(x, z0=Z0) -> np.array:
+    """
+    Complex impedance R + jX of the load from S11.
+    """
+    x = np.asarray(x)
+    return z0 * (1 + x) / (1 - x)
+
+
+def resistance(x, z0=Z0) -> np.array:
+    return impedance(x, z0).real
+
+
+def reactance(x, z0=Z0) -> np.array:
+    return impedance(x, z0).imag
+
+
+def q(x, z0=Z0) -> np.array:
+    """
+    Quality factor |X| / R of the load.
+    """
+    z = impedance(x, z0)
+    return np.abs(z.imag) / z.real
+
+
+def tdr(x, frequencies, nfft=256) -> (np.array, np.array):
+    """
+    Time domain reflection magnitude from a Blackman windowed inverse FFT.
+
+    :return: time axis in seconds, magnitudes
+    """
+    x = np.asarray(x)
+    window = np.blackman(x.shape[-1])
+    td = np.abs(np.fft.ifft(window * x, nfft, axis=-1))
+    time = 1 / (frequencies[1] - frequencies[0])
+    return np.linspace(0, time, nfft), td
@@ -0,0 +1,98 @@
+# Streaming statistics of continuous sweeps per frequency point, in memory of a few sweeps regardless of how many
+# are accumulated. The mean and variance are updated with Welford's algorithm, which stays accurate over long runs
+# where summing the squares would lose the small variance of a stable measurement.
+
+import numpy as np
+
+
+class SweepAccumulator:
+    """
+    Running mean, variance, min/max hold of the magnitude and an exponential average of complex sweeps.
+    The variance of a complex point is the mean of |x - mean|^2, the sum of the variances of the real and imaginary
+    parts.
+    """
+
+    def __init__(self, points, alpha=0.1, dtype=np.complex128):
+        """
+        :param points: Points of a sweep, or a shape like (arrays, points)
+        :param alpha: Weight of a new sweep in the exponential average, from 0 to 1
+        """
+        if not 0 < alpha <= 1:
+            raise AttributeError('alpha should be from 0 to 1')
+        self.shape = (points,) if np.isscalar(points) else tuple(points)
+        self.alpha = alpha
+        self.count = 0
+        self.mean = np.zeros(self.shape, dtype=dtype)
+        self.exponential = np.zeros(self.shape, dtype=dtype)
+        self._m2 = np.zeros(self.shape, dtype=np.float64)
+        self.min = np.full(self.shape, np.inf)
+        self.max = np.zeros(self.shape, dtype=np.float64)
+        self._delta = np.zeros(self.shape, dtype=dtype)
+        self._magnitude = np.zeros(self.shape, dtype=np.float64)
+
+    def reset(self):
+        self.count = 0
+        self.mean[...] = 0
+        self.exponential[...] = 0
+        self._m2[...] = 0
+        self.min[...] = np.inf
+        self.max[...] = 0
+
+    def add(self, data):
+        """
+        Adds one sweep. The update is done in place in the preallocated arrays.
+        """
+        data = np.asarray(data)
+        if data.shape != self.shape:
+            raise ValueError(f'Sweep of shape {data.shape}, should be {self.shape}')
+        self.count += 1
+        delta = np.subtract(data, self.mean, out=self._delta)
+        self.mean += delta / self.count
+        # delta * conj(data - new mean), the real part is the complex counterpart of delta * (x - new mean)
+        self._m2 += (delta * np.conj(data - self.mean)).real
+        np.abs(data, out=self._magnitude)
+        np.minimum(self.min, self._magnitude, out=self.min)
+        np.maximum(self.max, self._magnitude, out=self.max)
+        if self.count == 1:
+            self.exponential[...] = data
+        else:
+            self.exponential += self.alpha * (data - self.exponential)
+
+    def add_many(self, sweeps):
+        """
+        Adds sweeps x points at once, merging their statistics with the accumulated ones.
+        """
+        sweeps = np.asarray(sweeps)
+        if sweeps.shape[1:] != self.shape:
+            raise ValueError(f'Sweeps of shape {sweeps.shape[1:]}, should be {self.shape}')
+        n = len(sweeps)
+        if n == 0:
+            return
+        mean = sweeps.mean(axis=0)
+        m2 = (np.abs(sweeps - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self._m2 += m2 + np.abs(delta) ** 2 * self.count * n / total
+        self.mean += delta * n / total
+        magnitude = np.abs(sweeps)
+        np.minimum(self.min, magnitude.min(axis=0), out=self.min)
+        np.maximum(self.max, magnitude.max(axis=0), out=self.max)
+        # the exponential average of the sweeps in order, as if added one by one
+        weights = self.alpha * (1 - self.alpha) ** np.arange(n - 1, -1, -1)
+        if self.count == 0:
+            weights[0] = (1 - self.alpha) ** (n - 1)
+        else:
+            self.exponential *= (1 - self.alpha) ** n
+        self.exponential += np.tensordot(weights, sweeps, axes=1)
+        self.count = total
+
+    def variance(self, ddof=1) -> np.array:
+        """
+        :param ddof: 1 for the sample variance, 0 for the population variance
+        """
+        if self.count <= ddof:
+            return np.full(self.shape, np.nan)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=1) -> np.array:
+        return np.sqrt(self.variance(ddof))
@@ -0,0 +1,248 @@
+# Benchmark suite for the driver hot paths, run against the simulated device with a configurable link speed.
+#
+#   python -m nanovna.benchmark --link-speed 200000 --output bench.json
+#
+# Every scenario reports its rate and a per-phase breakdown of the time: write, wait (for the first byte of the
+# response), read, parse (the rest of the host time, fixed sleeps included) and encode (PNG compression).
+# The results are written as JSON, so two driver revisions can be compared.
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .device import NanoVNA
+from .measurements import Measurements
+from .parsing import parse_complex
+from .simulator import SimulatedNanoVNA
+
+
+class TimedSerial:
+    """
+    Wraps a serial object and accumulates the time spent in the serial calls.
+    A read that finds nothing waiting is counted as waiting for the device.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.phases = dict.fromkeys(('write', 'wait', 'read'), 0.0)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+    def reset(self):
+        self.phases = dict.fromkeys(self.phases, 0.0)
+        self.bytes_in = self.bytes_out = 0
+
+    def write(self, data):
+        begin = time.perf_counter()
+        n = self.serial.write(data)
+        self.phases['write'] += time.perf_counter() - begin
+        self.bytes_out += len(data)
+        return n
+
+    def read(self, size=1):
+        waiting = self.serial.in_waiting
+        begin = time.perf_counter()
+        data = self.serial.read(size)
+        self.phases['wait' if waiting == 0 else 'read'] += time.perf_counter() - begin
+        self.bytes_in += len(data)
+        return data
+
+
+class ByteReader(NanoVNA):
+    """
+    The byte-at-a-time reading the driver used before the Framer, kept here as the baseline.
+    """
+
+    def _read_line(self) -> bytearray:
+        line = bytearray()
+        while True:
+            b = bytes(self.serial.read())
+            line += b
+            if b == b'\n':
+                return line
+            if line == b'ch> ':
+                line = bytearray()
+                break
+        return line
+
+    def _read_block(self) -> bytes:
+        block = bytearray()
+        while True:
+            line = self._read_line()
+            if line == b'':
+                return bytes(block)
+            block += line
+
+
+def parse_lines(block: bytes) -> np.array:
+    # per line parsing of the data output, as get_data did before the vectorized parsing
+    x = []
+    for line in block.decode('utf-8').split('\n')[:-1]:
+        line = line.strip()
+        if line:
+            d = line.split(' ')
+            x.append(float(d[0]) + float(d[1]) * 1.j)
+    return np.array(x)
+
+
+# Cold start of the CLI without running a device command. Imports of numpy, pyserial or PIL would blow this.
+STARTUP_BUDGET = 0.15
+
+
+class Benchmark:
+
+    def __init__(self, link_speed=None, repeat=20, points=101, command_latency=0.0):
+        """
+        :param link_speed: Bytes per second of the simulated link, None for unlimited
+        :param repeat: How many times each scenario is run
+        :param points: Sweep points of the simulated device
+        :param command_latency: Seconds the simulated device is busy before answering a command
+        """
+        self.link_speed = link_speed
+        self.repeat = repeat
+        self.points = points
+        self.command_latency = command_latency
+
+    def _device(self, vna_class=NanoVNA) -> (NanoVNA, TimedSerial):
+        byte_latency = 1 / self.link_speed if self.link_speed else 0.0
+        simulator = SimulatedNanoVNA(points=self.points, byte_latency=byte_latency,
+                                     command_latency=self.command_latency)
+        serial = TimedSerial(simulator)
+        return vna_class(dev=serial), serial
+
+    def _run(self, name, operation, units, vna_class=NanoVNA, encode=None, repeat=None) -> dict:
+        """
+        Runs the operation repeatedly and returns the rate in units per second and the per run phase breakdown.
+        """
+        repeat = repeat or self.repeat
+        vna, serial = self._device(vna_class)
+        operation(vna)  # warm up
+        serial.reset()
+        encoding = 0.0
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            result = operation(vna)
+            if encode:
+                encode_begin = time.perf_counter()
+                encode(result)
+                encoding += time.perf_counter() - encode_begin
+        elapsed = time.perf_counter() - begin
+        phases = dict(serial.phases)
+        phases['encode'] = encoding
+        phases['parse'] = max(0.0, elapsed - sum(phases.values()))
+        return {
+            'name': name,
+            'seconds': elapsed / repeat,
+            'rate': units * repeat / elapsed,
+            'bytes_in_per_s': serial.bytes_in / elapsed,
+            'bytes_out_per_s': serial.bytes_out / elapsed,
+            'phases': {phase: seconds / repeat for phase, seconds in phases.items()},
+        }
+
+    def _parse(self, name, parse) -> dict:
+        block = SimulatedNanoVNA(points=self.points)._cmd_data()
+        repeat = self.repeat * 10
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            parse(block)
+        elapsed = time.perf_counter() - begin
+        return {'name': name, 'seconds': elapsed / repeat, 'rate': self.points * repeat / elapsed,
+                'phases': {'parse': elapsed / repeat}}
+
+    def _startup(self, name, argv, budget=None) -> dict:
+        """
+        Wall time of a fresh interpreter running argv, the best of a few runs.
+        """
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.environ.get('PYTHONPATH')])))
+        times = []
+        for _ in range(5):
+            begin = time.perf_counter()
+            subprocess.run([sys.executable] + argv, env=env, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - begin)
+        seconds = min(times)
+        result = {'name': name, 'seconds': seconds, 'rate': 1 / seconds, 'phases': {'import': seconds}}
+        if budget is not None:
+            result['budget'] = budget
+            result['over_budget'] = seconds > budget
+        return result
+
+    def run(self) -> [dict]:
+        results = [
+            self._startup('startup python', ['-c', 'pass']),
+            self._startup('startup import nanovna', ['-c', 'import nanovna']),
+            self._startup('startup cli --help', ['-m', 'nanovna', '--help'], STARTUP_BUDGET),
+            self._startup('startup cli info', ['-m', 'nanovna', '--simulate', 'info']),
+            self._run('set_trace commands/s', lambda vna: vna.set_trace(0, 'logmag', 0), 1),
+            self._run('get_data points/s baseline', lambda vna: vna.get_data(0), self.points, ByteReader),
+            self._run('get_data points/s', lambda vna: vna.get_data(0), self.points),
+            self._run('capture frames/s', lambda vna: vna.capture(), 1,
+                      encode=lambda image: image.save(io.BytesIO(), 'PNG')),
+            self._run('scan 1001 points/s', lambda vna: vna.scan(400e6, 470e6, 1001), 1001),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for view in ('polar', 'smith', 'swr'):
+                # the snapshots are slow, a couple of runs is enough
+                results.append(self._run(f'Measurements.{view} snapshots/s',
+                                         lambda vna: getattr(Measurements(vna, directory, 'bench'), view)(), 1,
+                                         repeat=2))
+
+        out = np.empty(self.points, dtype=np.complex64)
+        results.append(self._parse('parse lines points/s', parse_lines))
+        results.append(self._parse('parse vectorized points/s', parse_complex))
+        results.append(self._parse('parse into out points/s', lambda block: parse_complex(block, out)))
+        return results
+
+    def environment(self) -> dict:
+        try:
+            revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                      text=True).stdout.strip()
+        except OSError:
+            revision = None
+        return {
+            'revision': revision,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'link_speed': self.link_speed,
+            'command_latency': self.command_latency,
+            'repeat': self.repeat,
+            'points': self.points,
+            'time': time.time(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the NanoVNA driver against the simulated device')
+    parser.add_argument('--link-speed', type=float, default=None, help='bytes per second, unlimited by default')
+    parser.add_argument('--command-latency', type=float, default=0.0, help='seconds the device takes per command')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--points', type=int, default=101)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.link_speed, args.repeat, args.points, args.command_latency)
+    results = benchmark.run()
+    for result in results:
+        phases = ' '.join(f'{phase} {seconds * 1e3:.3f}' for phase, seconds in result['phases'].items())
+        warning = '   OVER BUDGET' if result.get('over_budget') else ''
+        print(f'{result["name"]:36} {result["rate"]:14.1f}   ms/run: {phases}{warning}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': benchmark.environment(), 'results': results}, f, indent=2)
+    if any(result.get('over_budget') for result in results):
+        sys.exit('Start-up over budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Host side calibration with the error terms of the device's own SOLT calibration.
+#
+# The device applies its calibration only to the sweep it was calibrated on. Here the error terms, data arrays 2-6,
+# are read once over a wide sweep (or several, combined), saved, interpolated to any other sweep and applied to raw
+# data measured with the device calibration off. Segmented and re-gridded sweeps then need no recalibration.
+#
+# The correction is the one the firmware applies, with the transmission tracking Et stored inverted by the device as
+# 1 / (S21thru - Ex), so it is multiplied instead of divided by:
+#   S11 = (S11m - Ed) / (Er + Es (S11m - Ed))
+#   S21 = (S21m - Ex) Et (1 - Es S11)
+
+import numpy as np
+
+from .device import NanoVNA
+
+# data array number of each error term
+TERMS = {
+    'directivity': 2,
+    'source_match': 3,
+    'reflection_tracking': 4,
+    'transmission_tracking': 5,
+    'isolation': 6,
+}
+
+
+class ErrorTerms:
+
+    def __init__(self, frequencies, directivity, source_match, reflection_tracking, transmission_tracking, isolation):
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+        self.directivity = np.asarray(directivity)
+        self.source_match = np.asarray(source_match)
+        self.reflection_tracking = np.asarray(reflection_tracking)
+        self.transmission_tracking = np.asarray(transmission_tracking)
+        self.isolation = np.asarray(isolation)
+
+    def _terms(self) -> dict:
+        return {name: getattr(self, name) for name in TERMS}
+
+    @classmethod
+    def acquire(cls, vna: NanoVNA) -> 'ErrorTerms':
+        """
+        Reads the error terms of the device calibration for the current sweep, all from a single pause.
+        """
+        acquisition = vna.acquire(tuple(TERMS.values()))
+        return cls(acquisition.frequencies, **{name: acquisition.data[array] for name, array in TERMS.items()})
+
+    @classmethod
+    def combine(cls, *terms) -> 'ErrorTerms':
+        """
+        Joins the error terms of several calibrated sweeps into one, for example calibrations of adjacent bands.
+        """
+        frequencies = np.concatenate([t.frequencies for t in terms])
+        order = np.argsort(frequencies, kind='stable')
+        return cls(frequencies[order], **{name: np.concatenate([getattr(t, name) for t in terms])[order]
+                                          for name in TERMS})
+
+    def save(self, path):
+        np.savez(path, frequencies=self.frequencies, **self._terms())
+
+    @classmethod
+    def load(cls, path) -> 'ErrorTerms':
+        with np.load(path) as f:
+            return cls(f['frequencies'], **{name: f[name] for name in TERMS})
+
+    def interpolate(self, frequencies) -> 'ErrorTerms':
+        """
+        Linear interpolation of the real and imaginary parts to another frequency axis, within the calibrated range.
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if frequencies.min() < self.frequencies[0] or frequencies.max() > self.frequencies[-1]:
+            raise ValueError(f'Frequencies outside the calibrated range from {self.frequencies[0]:.0f} '
+                             f'to {self.frequencies[-1]:.0f} Hz')
+        return ErrorTerms(frequencies, **{
+            name: np.interp(frequencies, self.frequencies, term.real) +
+            1j * np.interp(frequencies, self.frequencies, term.imag) for name, term in self._terms().items()})
+
+    def _at(self, frequencies) -> 'ErrorTerms':
+        if frequencies is None or (len(frequencies) == len(self.frequencies)
+                                   and np.array_equal(frequencies, self.frequencies)):
+            return self
+        return self.interpolate(frequencies)
+
+    def correct_s11(self, s11, frequencies=None) -> np.array:
+        """
+        :param s11: Raw S11 measured with the device calibration off, points or sweeps x points
+        :param frequencies: Frequencies of the points, when different from the error terms
+        """
+        terms = self._at(frequencies)
+        m = np.asarray(s11) - terms.directivity
+        return m / (terms.reflection_tracking + terms.source_match * m)
+
+    def correct_s21(self, s21, s11, frequencies=None) -> np.array:
+        """
+        :param s21: Raw S21 measured with the device calibration off
+        :param s11: Raw S11 of the same sweep, for the source match
+        :param frequencies: Frequencies of the points, when different from the error terms
+        """
+        terms = self._at(frequencies)
+        s11 = terms.correct_s11(s11)
+        return (np.asarray(s21) - terms.isolation) * terms.transmission_tracking * (1 - terms.source_match * s11)
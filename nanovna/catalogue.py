@@ -0,0 +1,193 @@
+# Index of the measurements saved as loose {directory}/{prefix}-{suffix}.npy and .png files.
+#
+# The index is a JSON lines file in the measurement directory, one line per saved dataset, appended to as the
+# datasets are saved. A later line for the same .npy file replaces the earlier one. Each line has the .npy header
+# (dtype, shape, data offset) too, so the data is memory-mapped directly without opening and parsing every file
+# first, and the queries only read the index.
+#
+# Files saved before the catalogue, or by the scripts directly, are added with index_directory(). Their sweep is not
+# known. Some of them hold pickled objects, like screen captures, instead of numeric arrays; those are recognized
+# from the header and never memory-mapped or unpickled implicitly.
+
+import glob
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .device import NanoVNA
+
+INDEX = 'catalogue.jsonl'
+
+# path and image are relative to the catalogue directory, start, stop and points are None when the sweep isn't known
+Entry = namedtuple('Entry', 'path image prefix suffix timestamp start stop points dtype shape fortran offset tags')
+
+
+def read_header(path) -> (np.dtype, tuple, bool, int):
+    """
+    :return: dtype, shape, Fortran order and data offset of a .npy file
+    """
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        return dtype, shape, fortran, f.tell()
+
+
+class Catalogue:
+
+    def __init__(self, directory, index=INDEX):
+        if not os.path.isdir(directory):
+            raise AttributeError(f'{directory} is not a directory')
+        self.directory = directory
+        self.index = os.path.join(directory, index)
+        self._entries = {}
+        self._columns = None
+        if os.path.exists(self.index):
+            with open(self.index) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entry['shape'] = tuple(entry['shape'])
+                        entry['tags'] = tuple(entry['tags'])
+                        self._entries[entry['path']] = Entry(**entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    @property
+    def entries(self) -> [Entry]:
+        return sorted(self._entries.values(), key=lambda entry: entry.timestamp)
+
+    def _relative(self, path) -> str:
+        return os.path.relpath(path, self.directory)
+
+    def _absolute(self, path) -> str:
+        return os.path.join(self.directory, path)
+
+    def add(self, path, image=None, sweep=None, timestamp=None, tags=(), prefix=None) -> Entry:
+        """
+        Indexes a saved .npy file.
+
+        :param image: The .png saved with the data, if any
+        :param sweep: start, stop and points of the data
+        :param timestamp: Time of the measurement, the modification time of the file by default
+        :param prefix: Prefix of the file name, up to the first '-' by default
+        """
+        dtype, shape, fortran, offset = read_header(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        if prefix is None or not name.startswith(prefix + '-'):
+            prefix = name.partition('-')[0]
+        suffix = name[len(prefix) + 1:]
+        start, stop, points = sweep if sweep is not None else (None, None, None)
+        entry = Entry(
+            path=self._relative(path),
+            image=self._relative(image) if image is not None else None,
+            prefix=prefix,
+            suffix=suffix,
+            timestamp=timestamp if timestamp is not None else os.path.getmtime(path),
+            start=None if start is None else float(start),
+            stop=None if stop is None else float(stop),
+            points=None if points is None else int(points),
+            dtype=dtype.str if not dtype.hasobject else 'object',
+            shape=tuple(shape),
+            fortran=fortran,
+            offset=offset if not dtype.hasobject else None,
+            tags=tuple(tags),
+        )
+        with open(self.index, 'a') as f:
+            f.write(json.dumps(entry._asdict()) + '\n')
+        self._entries[entry.path] = entry
+        self._columns = None
+        return entry
+
+    def index_directory(self) -> [Entry]:
+        """
+        Adds the .npy files of the directory that are not in the catalogue yet, with the .png of the same name.
+
+        :return: The added entries
+        """
+        added = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.npy'))):
+            if self._relative(path) in self._entries:
+                continue
+            image = os.path.splitext(path)[0] + '.png'
+            added.append(self.add(path, image if os.path.exists(image) else None))
+        return added
+
+    def _table(self) -> (list, np.array, np.array, np.array):
+        if self._columns is None:
+            entries = self.entries
+            nan = float('nan')
+            self._columns = (
+                entries,
+                np.array([entry.timestamp for entry in entries], dtype=np.float64),
+                np.array([nan if entry.start is None else entry.start for entry in entries], dtype=np.float64),
+                np.array([nan if entry.stop is None else entry.stop for entry in entries], dtype=np.float64),
+            )
+        return self._columns
+
+    def query(self, prefix=None, since=None, until=None, covers=None, tags=()) -> [Entry]:
+        """
+        :param prefix: Measurement prefix, for example 'attenuators'
+        :param since: Earliest timestamp, inclusive
+        :param until: Latest timestamp, exclusive
+        :param covers: Frequency, or (low, high) frequency range, the sweep should include. Entries of unknown sweep
+            never match.
+        :param tags: Tags the entries should all have
+        :return: Matching entries from the oldest
+        """
+        entries, timestamps, starts, stops = self._table()
+        match = np.ones(len(entries), dtype=bool)
+        if since is not None:
+            match &= timestamps >= since
+        if until is not None:
+            match &= timestamps < until
+        if covers is not None:
+            low, high = (covers, covers) if np.isscalar(covers) else covers
+            match &= (starts <= low) & (stops >= high)  # NaN compares False
+        return [entries[i] for i in np.flatnonzero(match)
+                if (prefix is None or entries[i].prefix == prefix) and set(tags) <= set(entries[i].tags)]
+
+    def load(self, entry: Entry, allow_pickle=False) -> np.array:
+        """
+        Maps the data read only, without reading it. Pickled objects are loaded only with allow_pickle, only from
+        trusted files, as unpickling can run any code.
+        """
+        path = self._absolute(entry.path)
+        if entry.offset is None:
+            if not allow_pickle:
+                raise ValueError(f'{entry.path} holds pickled objects, load it with allow_pickle=True')
+            return np.load(path, allow_pickle=True)
+        return np.memmap(path, dtype=np.dtype(entry.dtype), mode='r', offset=entry.offset, shape=entry.shape,
+                         order='F' if entry.fortran else 'C')
+
+    def stack(self, entries) -> np.array:
+        """
+        Loads the data of entries of the same shape as one entries x points array, for comparing them.
+        """
+        entries = list(entries)
+        if not entries:
+            raise ValueError('No entries to stack')
+        if len({entry.shape for entry in entries}) > 1:
+            raise ValueError('The entries have different shapes')
+        dtype = np.result_type(*[np.dtype(entry.dtype) for entry in entries])
+        out = np.empty((len(entries),) + entries[0].shape, dtype=dtype)
+        for i, entry in enumerate(entries):
+            out[i] = self.load(entry)
+        return out
+
+    @staticmethod
+    def frequencies(entry: Entry) -> np.array:
+        """
+        Frequency axis of the entry, None when the sweep isn't known.
+        """
+        if entry.points is None:
+            return None
+        return NanoVNA.frequency_axis(entry.start, entry.stop, entry.points)
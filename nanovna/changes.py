@@ -0,0 +1,107 @@
+# Change detection between the sweeps and their storage, for long-term monitoring where nearly every sweep is the
+# same as the previous one. Each sweep is compared against a reference sweep with a couple of vectorized distances,
+# and only the sweeps that differ by more than a threshold are stored, plus a keyframe now and then to show the
+# monitoring was still running.
+
+import time
+
+import numpy as np
+
+from . import analysis
+
+
+class ChangeDetector:
+    """
+    Decides which sweeps to store. The reference is the last stored sweep by default, so a slow drift is stored once
+    it has added up to the threshold. With alpha, the reference is instead an exponential moving average of all the
+    sweeps, which follows slow drifts and stores only the faster changes.
+    """
+
+    def __init__(self, threshold=0.01, swr_threshold=None, frequencies=None, band=None, keyframe_interval=600.0,
+                 alpha=None, s11_row=0):
+        """
+        :param threshold: Largest |delta S| of any point, in linear units, that is not a change
+        :param swr_threshold: Largest SWR difference of the S11 points in the band that is not a change, or None
+        :param frequencies: Frequency axis of the sweeps, needed with band
+        :param band: (low, high) frequencies the SWR is compared in, the whole sweep by default
+        :param keyframe_interval: Seconds after which a sweep is stored even without a change, or None
+        :param alpha: Weight of a new sweep in the moving average reference, from 0 to 1, or None
+        :param s11_row: Row of S11 in two dimensional arrays x points data
+        """
+        if band is not None and frequencies is None:
+            raise AttributeError('The frequencies are needed to compare a band')
+        if alpha is not None and not 0 < alpha <= 1:
+            raise AttributeError('alpha should be from 0 to 1')
+        self.threshold = threshold
+        self.swr_threshold = swr_threshold
+        self.band = None
+        if band is not None:
+            frequencies = np.asarray(frequencies)
+            self.band = (frequencies >= band[0]) & (frequencies <= band[1])
+        self.keyframe_interval = keyframe_interval
+        self.alpha = alpha
+        self.s11_row = s11_row
+        self.reference = None
+        self._reference_swr = None
+        self.last_stored = None
+        self.checked = 0
+        self.stored = 0
+        self.delta = None
+        self.swr_delta = None
+
+    def reset(self):
+        """
+        Forgets the reference, the next sweep is stored as a keyframe.
+        """
+        self.reference = None
+        self.last_stored = None
+
+    def _swr(self, data) -> np.array:
+        s11 = data[self.s11_row] if data.ndim > 1 else data
+        if self.band is not None:
+            s11 = s11[self.band]
+        with np.errstate(divide='ignore'):
+            return analysis.vswr(s11)
+
+    def _set_reference(self, data):
+        if self.reference is None or self.reference.shape != data.shape:
+            self.reference = np.array(data, dtype=np.complex128)
+        else:
+            np.copyto(self.reference, data)
+        if self.swr_threshold is not None:
+            self._reference_swr = self._swr(self.reference)
+
+    def update(self, data, timestamp=None) -> bool:
+        """
+        Compares a sweep, a points or arrays x points array, against the reference.
+
+        :return: True if the sweep should be stored
+        """
+        data = np.asarray(data)
+        timestamp = time.time() if timestamp is None else timestamp
+        self.checked += 1
+        if self.reference is None or self.reference.shape != data.shape:
+            self.delta = self.swr_delta = None
+            store = True
+        else:
+            self.delta = float(np.max(np.abs(data - self.reference)))
+            store = self.delta > self.threshold
+            if self.swr_threshold is not None:
+                with np.errstate(invalid='ignore'):
+                    difference = np.abs(self._swr(data) - self._reference_swr)
+                # a point at the edge of the Smith chart in both sweeps is not a change
+                self.swr_delta = float(np.max(np.nan_to_num(difference, nan=0.0, posinf=np.inf), initial=0))
+                store = store or self.swr_delta > self.swr_threshold
+            if self.keyframe_interval is not None:
+                store = store or timestamp - self.last_stored >= self.keyframe_interval
+
+        if store:
+            self.stored += 1
+            self.last_stored = timestamp
+        if self.alpha is not None and self.reference is not None and self.reference.shape == data.shape:
+            self.reference += self.alpha * (data - self.reference)
+            if self.swr_threshold is not None:
+                self._reference_swr = self._swr(self.reference)
+        elif store:
+            self._set_reference(data)
+        return store
@@ -0,0 +1,110 @@
+# Command line interface, `python -m nanovna <command>`. The subcommands import what they need only when run, so the
+# start-up stays small: the argument parsing doesn't load numpy, pyserial or PIL, and only capture loads PIL.
+
+import argparse
+import logging
+import sys
+
+
+def _device(args):
+    from .device import NanoVNA
+    if args.simulate:
+        from .simulator import SimulatedNanoVNA
+        return NanoVNA(dev=SimulatedNanoVNA())
+    return NanoVNA(dev=args.port)
+
+
+def info(args):
+    for line in _device(args).get_info():
+        print(line)
+
+
+def sweep(args):
+    vna = _device(args)
+    if args.start is not None:
+        vna.set_sweep(args.start, args.stop, args.points)
+    print('%d %d %d' % vna.get_sweep())
+
+
+def data(args):
+    import numpy as np
+    vna = _device(args)
+    if args.start is not None:
+        frequencies, s11, s21 = vna.scan(args.start, args.stop, args.points)
+        columns = [frequencies] + [{0: s11, 1: s21}[array] for array in args.arrays]
+    else:
+        acquisition = vna.acquire(args.arrays)
+        columns = [acquisition.frequencies] + [acquisition.data[array] for array in args.arrays]
+    table = np.column_stack([columns[0]] + [part for c in columns[1:] for part in (c.real, c.imag)])
+    np.savetxt(sys.stdout, table, fmt=['%d'] + ['%.9f'] * (table.shape[1] - 1))
+
+
+def capture(args):
+    _device(args).capture().save(args.file, 'PNG')
+
+
+def record(args):
+    from .recorder import SweepRecorder
+    vna = _device(args)
+    detector = None
+    if args.threshold is not None:
+        from .changes import ChangeDetector
+        detector = ChangeDetector(args.threshold, keyframe_interval=args.keyframe_interval)
+    with SweepRecorder(args.file, vna.frequencies, args.arrays, detector=detector) as recorder:
+        try:
+            recorder.record(vna, args.count, args.duration, args.interval)
+        except KeyboardInterrupt:
+            pass
+        logging.info('Recorded %d sweeps to %s', recorder.count, args.file)
+
+
+def parser() -> argparse.ArgumentParser:
+    root = argparse.ArgumentParser(prog='nanovna', description='NanoVNA command line')
+    root.add_argument('--port', help='tty of the device, found by USB VID/PID by default')
+    root.add_argument('--simulate', action='store_true', help='use the simulated device instead')
+    root.add_argument('-v', '--verbose', action='store_true')
+    commands = root.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('info', help='print the device info').set_defaults(run=info)
+
+    command = commands.add_parser('sweep', help='print, or set and print, the sweep start, stop and points')
+    command.add_argument('start', type=float, nargs='?')
+    command.add_argument('stop', type=float, nargs='?')
+    command.add_argument('points', type=int, nargs='?', default=101)
+    command.set_defaults(run=sweep)
+
+    command = commands.add_parser('data', help='print frequency and real, imag columns of the data arrays')
+    command.add_argument('--arrays', type=int, nargs='+', default=[0], help='0: S11, 1: S21, 2-6: error terms')
+    command.add_argument('--start', type=float, help='scan this range instead of reading the current sweep')
+    command.add_argument('--stop', type=float)
+    command.add_argument('--points', type=int, default=101, help='more than 101 points are scanned in segments')
+    command.set_defaults(run=data)
+
+    command = commands.add_parser('capture', help='save the screen as PNG')
+    command.add_argument('file')
+    command.set_defaults(run=capture)
+
+    command = commands.add_parser('record', help='record sweeps continuously to a file until interrupted')
+    command.add_argument('file')
+    command.add_argument('--arrays', type=int, nargs='+', default=[0])
+    command.add_argument('--count', type=int)
+    command.add_argument('--duration', type=float, help='seconds')
+    command.add_argument('--interval', type=float, default=0.0, help='minimum seconds between sweeps')
+    command.add_argument('--threshold', type=float, help='store only sweeps that differ by more than this |delta S|')
+    command.add_argument('--keyframe-interval', type=float, default=600.0,
+                         help='seconds after which a sweep is stored anyway, with --threshold')
+    command.set_defaults(run=record)
+    return root
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s',
+                        level=logging.DEBUG if args.verbose else logging.INFO)
+    if args.command in ('sweep', 'data') and (args.start is None) != (args.stop is None):
+        parser().error('the start and the stop should be given together')
+    if args.command in ('data', 'record') and not set(args.arrays) <= set(range(7)):
+        parser().error('there are data arrays only from 0 to 6')
+    if args.command == 'data' and args.start is not None and not set(args.arrays) <= {0, 1}:
+        parser().error('only the arrays 0 and 1 can be scanned')
+    args.run(args)
@@ -0,0 +1,78 @@
+# Port discovery and connection bookkeeping for NanoVNA.
+#
+# Enumerating the ports goes through the whole USB device tree, so the result is cached for a few seconds. Creating
+# several NanoVNA objects, or a DevicePool, then enumerates only once. A reconnect after a USB reset refreshes it.
+#
+# The devices are told apart by their tty. The USB serial number is only a tag: the NanoVNA firmwares usually report
+# the same fixed serial string on every unit, so it can't identify a device unless it happens to be unique.
+
+import logging
+import threading
+import time
+from collections import deque
+
+DISCOVERY_TTL = 5.0
+
+_discovered = {}  # (vid, pid): (monotonic time, {tty: serial number})
+_lock = threading.Lock()
+
+
+def discover(vid, pid, refresh=False) -> {str: str}:
+    """
+    :param refresh: Enumerate the ports even if the cached result is recent
+    :return: USB serial number, or None, of every connected device of the VID/PID by tty, in tty order
+    """
+    with _lock:
+        cached = _discovered.get((vid, pid))
+        if not refresh and cached is not None and time.monotonic() - cached[0] < DISCOVERY_TTL:
+            return dict(cached[1])
+    from serial.tools import list_ports
+    ttys = {device.device: device.serial_number for device in sorted(list_ports.comports(), key=lambda d: d.device)
+            if device.vid == vid and device.pid == pid}
+    serial_numbers = [serial_number for serial_number in ttys.values() if serial_number]
+    if len(set(serial_numbers)) < len(serial_numbers):
+        logging.warning('Several devices report the same USB serial number, they are told apart by the tty only')
+    with _lock:
+        _discovered[(vid, pid)] = (time.monotonic(), ttys)
+    return dict(ttys)
+
+
+def unique_serial_number(ttys, tty) -> str:
+    """
+    :param ttys: Result of discover
+    :return: Serial number of the tty, None if it has none or another device reports the same one
+    """
+    serial_number = ttys.get(tty)
+    if serial_number is None or list(ttys.values()).count(serial_number) > 1:
+        return None
+    return serial_number
+
+
+class ConnectionStats:
+    """
+    Reconnects after lost connections, and resyncs after the output got out of step with the commands. The latest
+    events are kept as (timestamp, kind, seconds it took).
+    """
+
+    def __init__(self, history=100):
+        self.reconnects = 0
+        self.resyncs = 0
+        self.device_resets = 0  # 'NanoVNA Shell' banners seen while resyncing
+        self.events = deque(maxlen=history)
+
+    def event(self, kind, seconds):
+        if kind == 'reconnect':
+            self.reconnects += 1
+        elif kind == 'resync':
+            self.resyncs += 1
+        elif kind == 'device_reset':
+            self.device_resets += 1
+        self.events.append((time.time(), kind, seconds))
+
+    def snapshot(self) -> dict:
+        return {
+            'reconnects': self.reconnects,
+            'resyncs': self.resyncs,
+            'device_resets': self.device_resets,
+            'events': list(self.events),
+        }
@@ -5,48 +5,242 @@
 # power sample scan sweep test touchcal touchtest pause resume cal save recall trace marker edelay capture vbat
 # vbat_offset transform threshold help info color
 
-import serial
-from serial.tools import list_ports
+# pyserial, PIL and the thread pool are imported only when used, to keep `import nanovna` and the CLI fast
+
+import functools
 import time
 import logging
-import PIL
-import struct
 import numpy as np
+from collections import deque, namedtuple
+
+from .connection import ConnectionStats, discover, unique_serial_number
+from .framing import Framer
+from .parsing import parse_complex, parse_real
+from .state import DeviceState
+
+_RGBA_TABLE = None  # RGB565 to RGBA lookup for decode_capture, built on first use
+
+# One consistent set of data arrays by array number, read within a single pause
+Acquisition = namedtuple('Acquisition', 'timestamp sweep frequencies data')
+
+
+class CommandError(OSError):
+    """
+    The device didn't accept commands, answering '<cmd>?' or with the usage text.
+    """
+
+    def __init__(self, errors):
+        """
+        :param errors: list of (command, output lines) of the failed commands
+        """
+        self.errors = errors
+        super().__init__('Commands failed: ' + ', '.join(f'{cmd!r} {lines}' for cmd, lines in errors))
+
+
+# Configuration commands that print nothing when they succeed. Their usage texts don't all start with 'usage:', and
+# sweep and scan print 'frequency range is invalid', so any output of theirs is an error.
+_SILENT_COMMANDS = {'trace', 'marker', 'sweep', 'scan'}
+
+
+def _failed(cmd, lines) -> bool:
+    name, *args = cmd.split(' ')
+    if name in _SILENT_COMMANDS and args:
+        return any(lines)
+    return any(line == f'{name}?' or line.startswith('usage:') for line in lines)
 
 
 class NanoVNA:
     VID = 0x0483  # 1155
     PID = 0x5740  # 22336
+    SEGMENT_POINTS = 101  # the most points the device can sweep at once
+    WIDTH = 320  # screen size for capture
+    HEIGHT = 240
+    RECONNECT_TIMEOUT = 5.0  # how long to wait for the tty to come back, for example after a USB reset
+    BANNER = b'NanoVNA Shell'  # printed by the shell after the device has been reset
 
-    def __init__(self, loglevel=logging.INFO):
-        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=loglevel)
-        self._tty = self.get_tty()
+    def __init__(self, dev=None, skip_redundant=False, instrumentation=None, loglevel=None):
+        """
+        :param dev: tty of the device, or an already opened serial-like object. Found by VID/PID when omitted.
+        :param skip_redundant: Don't send trace and marker commands that wouldn't change the cached state. Changes made
+            on the touch screen are not seen by the cache.
+        :param instrumentation: Optional nanovna.instrumentation.Instrumentation to record the command latencies,
+            transferred bytes, parse times and protocol errors into
+        :param loglevel: Deprecated and ignored, the application configures the logging
+        """
         self.serial = None
-        self._frequencies = None
-        self.points = 101
+        self._framer = None
+        if isinstance(dev, int):  # NanoVNA(logging.DEBUG), loglevel used to be the first argument
+            loglevel, dev = dev, None
+        if loglevel is not None:
+            import warnings
+            warnings.warn('The loglevel of NanoVNA is ignored, configure the logging in the application instead',
+                          DeprecationWarning, stacklevel=2)
+        self.serial_number = None  # finds the tty again after a USB reset if it changes, when unique
+        if dev is None:
+            self._tty, self.serial_number = self._discover()
+        elif isinstance(dev, str):
+            self._tty = dev
+        else:
+            self._tty = None
+            self.serial = dev
+            self._framer = Framer(dev)
+        self.state = DeviceState()
+        self.skip_redundant = skip_redundant
+        self.instrumentation = instrumentation
+        self.connection = ConnectionStats()
+        self._pending = deque()  # (name, bytes out, write time) of the sent commands not yet read, when instrumented
+        self._consumed = 0
 
     def __del__(self):
         self._close()
 
     @staticmethod
-    def get_tty() -> str:
-        device_list = list_ports.comports()
-        for device in device_list:
-            if device.vid == NanoVNA.VID and device.pid == NanoVNA.PID:
-                logging.info(f'Using {device}')
-                return device.device
+    def get_ttys(refresh=False) -> {str: str}:
+        """
+        :param refresh: Enumerate the ports again, instead of using the result cached for a few seconds
+        :return: USB serial number of every connected NanoVNA by tty. Identical units often report the same one.
+        """
+        return discover(NanoVNA.VID, NanoVNA.PID, refresh)
+
+    @staticmethod
+    def _discover() -> (str, str):
+        """
+        :return: tty of the first NanoVNA and its serial number, if no other connected unit reports the same one
+        """
+        ttys = NanoVNA.get_ttys()
+        for tty, serial_number in ttys.items():
+            logging.info('Using %s (%s)', tty, serial_number)
+            return tty, unique_serial_number(ttys, tty)
         raise OSError("USB device not found")
 
+    @staticmethod
+    def get_tty() -> str:
+        return NanoVNA._discover()[0]
+
     def _open(self):
         if self.serial is None:
-            self.serial = serial.Serial(self._tty)
-            time.sleep(0.2)  # On device reset, the buffer has multiple prompts and 'NanoVNA Shell' text in it
-            self.serial.reset_input_buffer()
-            self.serial.reset_output_buffer()
+            self._connect()
+
+    def _connect(self):
+        """
+        Opens the tty and syncs to the shell. A tty that is missing or fails is retried until RECONNECT_TIMEOUT, as it
+        takes a moment to come back after a USB reset. If the tty is gone, it is looked up again by the serial number,
+        but only when exactly one device reports it, so another unit with the same serial is never opened instead.
+        """
+        import serial
+        deadline = time.monotonic() + self.RECONNECT_TIMEOUT
+        retry = False
+        while True:
+            try:
+                if retry and self.serial_number is not None:
+                    ttys = self.get_ttys(refresh=True)
+                    matches = [tty for tty, serial_number in ttys.items() if serial_number == self.serial_number]
+                    if self._tty not in ttys and len(matches) == 1:
+                        self._tty = matches[0]
+                self.serial = serial.Serial(self._tty)
+                self.serial.reset_input_buffer()
+                self.serial.reset_output_buffer()
+                self._framer = Framer(self.serial)
+                self.state.clear()  # the device might have been reset or reconfigured in between
+                self._sync()
+                return
+            except OSError:  # including serial.SerialException
+                self._close()
+                if time.monotonic() >= deadline:
+                    raise
+                retry = True
+                time.sleep(0.1)
+
+    def _reconnect(self, error):
+        """
+        Closes the lost connection and opens it again. Only a connection to a tty can be reopened, for an already
+        opened serial-like object the error is raised.
+        """
+        if self._tty is None:
+            raise error
+        if self.serial_number is None:
+            self.serial_number = unique_serial_number(self.get_ttys(), self._tty)
+        logging.warning('Connection to %s lost (%s), reconnecting', self._tty, error)
+        begin = time.monotonic()
+        self._close()
+        self._pending.clear()
+        self._connect()
+        self.connection.event('reconnect', time.monotonic() - begin)
+
+    def _sync(self) -> [bytes]:
+        """
+        On device reset, the buffer has multiple prompts and 'NanoVNA Shell' text in it, and more can still be on the
+        way. Instead of sleeping until it has arrived, an unknown command is sent and everything up to its
+        '<cmd>?' answer and the following prompt is discarded.
+
+        :return: The discarded lines
+        """
+        marker = 'sync%d' % time.monotonic_ns()
+        self.serial.write(f'\r{marker}\r'.encode())
+        answer = f'{marker}?'.encode()
+        discarded = []
+        while True:
+            line = self._framer.read_line()
+            if line.strip() == answer:
+                break
+            discarded.append(line)
+        self._framer.read_block()
+        return discarded
+
+    def resync(self) -> bool:
+        """
+        Drains the output up to a known prompt, for when the output has got out of step with the commands, for example
+        after the device was reset with its button. Nothing is sent or read twice afterwards.
+
+        :return: True if the device had been reset, and its state was cleared
+        """
+        begin = time.monotonic()
+        self._open()
+        discarded = b''.join(self._sync())
+        self._pending.clear()
+        self.connection.event('resync', time.monotonic() - begin)
+        if self.BANNER in discarded:
+            self.state.clear()
+            self.connection.event('device_reset', 0.0)
+            return True
+        return False
 
     def _close(self):
         if self.serial:
             self.serial.close()
+            self.serial = None
+
+    def _write(self, payload):
+        try:
+            self.serial.write(payload)
+        except OSError as error:
+            self._reconnect(error)
+            self.serial.write(payload)
+
+    def _lost(self, error):
+        self._reconnect(error)
+        raise ConnectionError('The connection was lost and reopened, the output of the command is lost') from error
+
+    def _check_echo(self, echo, payload):
+        """
+        The first line after writing a command should be its echo. Anything else, like a stale prompt or the banner of
+        a reset device, means the output is out of step: everything is drained and the command written again, as the
+        commands are safe to repeat.
+        """
+        if echo.strip() == payload.split(b'\r', 1)[0].strip():
+            return
+        logging.warning('Out of sync, got %s instead of the echo of %s', echo, payload)
+        if self.instrumentation is not None:
+            self.instrumentation.protocol_error()
+        pending = list(self._pending)
+        self.resync()
+        self._pending.extend(pending)
+        if self.BANNER in echo:
+            self.state.clear()
+        self._write(payload)
+        echo = self._read_line()
+        if echo.strip() != payload.split(b'\r', 1)[0].strip():
+            raise ConnectionError(f'Out of sync, got {echo} instead of the echo of {payload}')
 
     def _send_command(self, cmd):
         """
@@ -75,45 +269,168 @@ class NanoVNA:
             cmd += '\r'
 
         self._open()
-        logging.debug(f'Sending: {cmd.encode()}')
-        self.serial.write(cmd.encode())
+        payload = cmd.encode()
+        logging.debug('Sending: %s', payload)
+        if self.instrumentation is not None:
+            self._start(cmd, len(payload))
+        self._write(payload)
         data = self._read_line()
-        logging.debug(f'Result: {data}')
+        logging.debug('Result: %s', data)
+        self._check_echo(data, payload)
 
-    def _read_line(self) -> bytearray:
-        line = bytearray()
-        while True:
-            b = bytes(self.serial.read())
-            line += b
-            if b == b'\n':
-                return line
-            if line == b'ch> ':
-                line = bytearray()
-                break
-        return line
+    def _start(self, cmd, size):
+        if not self._pending:
+            self._consumed = self._framer.consumed
+        self._pending.append((cmd.split(' ', 1)[0].strip(), size, time.perf_counter()))
+
+    def _finish(self, block):
+        if not self._pending:
+            return
+        name, size, begin = self._pending.popleft()
+        consumed = self._framer.consumed
+        error = block.startswith(name.encode() + b'?') or block.startswith(b'usage:')
+        self.instrumentation.command(name, time.perf_counter() - begin, size, consumed - self._consumed, error)
+        self._consumed = consumed
+
+    def _parse(self, parser, *args):
+        if self.instrumentation is None:
+            return parser(*args)
+        begin = time.perf_counter()
+        try:
+            return parser(*args)
+        finally:
+            self.instrumentation.parse(time.perf_counter() - begin)
+
+    def _read_line(self) -> bytes:
+        try:
+            return self._framer.read_line()
+        except OSError as error:
+            self._lost(error)
+
+    def _read_block(self) -> bytes:
+        try:
+            block = self._framer.read_block()
+        except OSError as error:
+            self._lost(error)
+        if self.instrumentation is not None:
+            self._finish(block)
+        return block
 
     def _read_lines(self) -> [str]:
-        result = []
+        block = self._read_block()
+        return [line.strip() for line in block.decode('utf-8').split('\n')[:-1]]
+
+    def _pipeline(self, commands) -> [bytes]:
+        """
+        Writes all the commands at once and only then reads their outputs. The shell echoes and executes them one by
+        one in order, so the outputs are separated by the echo lines and prompts as usual, but there is a single
+        round-trip instead of one per command.
+
+        :return: output block of each command
+        """
+        if not commands:
+            return []
+        self._open()
+        payload = ''.join(cmd if cmd.endswith('\r') else cmd + '\r' for cmd in commands).encode()
+        logging.debug('Sending: %s', payload)
+        if self.instrumentation is not None:
+            for cmd in commands:
+                self._start(cmd, len(cmd.rstrip('\r')) + 1)
+        self._write(payload)
+        self._check_echo(self._read_line(), payload)  # once the first echo is right, the rest follow in step
+        blocks = [self._read_block()]
+        for _ in commands[1:]:
+            self._read_line()  # echo
+            blocks.append(self._read_block())
+        return blocks
+
+    def batch(self) -> 'Batch':
+        """
+        Collects configuration commands and sends them in one pipelined write when the with block ends:
+
+            with vna.batch() as batch:
+                batch.set_trace(0, 'polar', 0)
+                batch.set_marker(1, 'off')
+        """
+        return Batch(self)
+
+    def ping(self) -> float:
+        """
+        Round-trip of an empty command, the shell answers it after all the previous commands are done.
+
+        :return: Round-trip time in seconds
+        """
+        begin = time.perf_counter()
+        self._send_command('')
+        self._read_lines()
+        return time.perf_counter() - begin
+
+    def settle(self, array=0, timeout=1.0, tolerance=0.02, noise=0.01, sweeps=0) -> bool:
+        """
+        Waits until the device has settled, instead of sleeping a fixed time: consecutive reads of the data array
+        differ only by the trace noise. The RMS of their difference is compared with tolerance times the RMS of the
+        data, or with noise for data close to zero, whichever is larger. The largest difference of a point should also
+        be within a few times that RMS spread, as it is for noise, so a change in a few points isn't averaged away.
+        Each read is a full round-trip, so the previous commands have been processed too.
+
+        Changing the traces doesn't change the data at all, only the next sweep draws them on the screen, so sweeps
+        can ask to wait for that many complete sweeps after the previous commands as well. A new sweep is seen from
+        the noise of the first point changing, and a sweep that started after the first read is complete once the
+        next one starts.
+
+        :param tolerance: Largest RMS change relative to the data, the sweep to sweep noise stays well below it
+        :param noise: Largest RMS change in the units of the data, for a load close to a match
+        :param sweeps: Complete sweeps to wait for, the device has to be sweeping
+        :return: False, if the data didn't settle within timeout seconds
+        """
+        end = time.monotonic() + timeout
+        started = 0  # new sweeps seen since the first read
+        previous = self.get_data(array)
         while True:
-            line = self._read_line()
-            if line == b'':
-                break
-            result.append(line.decode('utf-8').strip())
-        return result
+            current = self.get_data(array)
+            if len(current) != len(previous):
+                started += 1
+            else:
+                if len(current) and current[0] != previous[0]:
+                    started += 1
+                difference = np.abs(current - previous)
+                change = np.sqrt(np.mean(difference ** 2)) if len(current) else 0.0
+                level = np.sqrt(np.mean(np.abs(current) ** 2)) if len(current) else 0.0
+                if (change <= max(tolerance * level, noise) and np.max(difference, initial=0) <= max(5 * change, noise)
+                        and (not sweeps or started > sweeps)):
+                    return True
+            if time.monotonic() >= end:
+                logging.warning('Data did not settle in %s s', timeout)
+                return False
+            previous = current
+
+    def _configure(self, cmd):
+        """
+        Sends a configuration command and raises CommandError if the device didn't accept it. The cached state is
+        updated by the caller only after this returns, so it never holds a setting the device refused.
+        """
+        self._send_command(cmd)
+        # the device output buffer contains the command, and the next prompt
+        lines = self._read_lines()
+        if _failed(cmd, lines):
+            raise CommandError([(cmd, lines)])
 
     # marker [n] [on|off|{index}]
     # marker numbering starts from 1
     # the index is the point what value the marker should display from 0 to 100 (101) points by default
     def set_marker(self, n: int, index):
-        self._send_command('marker %d %s' % (n, index))
-        self._read_lines()
+        if not self.state.changes_marker(n, index) and self.skip_redundant:
+            return
+        self._configure('marker %d %s' % (n, index))
+        self.state.set_marker(n, index)
 
     # trace {0|1|2|3|all} [logmag|phase|delay|smith|polar|linear|swr|real|imag|r|x|q|off] [src]
     # trace {0|1|2|3} {scale|refpos} {value}
     def set_trace(self, trace, trace_format, channel):
-        self._send_command('trace %s %s %s' % (trace, trace_format, channel))
-        # the device output buffer contains the command, and the next prompt
-        self._read_lines()
+        if not self.state.changes_trace(trace, trace_format, channel) and self.skip_redundant:
+            return
+        self._configure('trace %s %s %s' % (trace, trace_format, channel))
+        self.state.set_trace(trace, trace_format, channel)
 
     # pause doesn't return anything but the 'ch> ' prompt, but as there is a \n\r and that prompt in the buffer
     # it's important to read them both, so the next command doesn't get confused
@@ -125,19 +442,69 @@ class NanoVNA:
         self._send_command('resume')
         self._read_lines()
 
-    def get_frequencies(self):
+    def get_frequencies(self, out=None) -> np.array:
         self._send_command('frequencies')
-        return self._read_lines()
+        frequencies = self._parse(parse_real, self._read_block(), out)
+        self.state.frequencies = frequencies.copy() if out is not None else frequencies
+        return frequencies
+
+    @property
+    def frequencies(self) -> np.array:
+        """
+        Frequency axis of the current sweep, queried only when the sweep has changed.
+        """
+        if self.state.frequencies is None or len(self.state.frequencies) != self.points:
+            self.get_frequencies()
+        return self.state.frequencies
+
+    @property
+    def points(self) -> int:
+        return self.sweep[2]
 
-    def capture(self) -> PIL.Image:
+    def index_of(self, frequency) -> int:
+        """
+        Index of the sweep point closest to the frequency, for example for set_marker.
+        """
+        return int(np.abs(self.frequencies - frequency).argmin())
+
+    # the device is rebooted, the connection is lost and has to be opened again
+    def reset(self):
+        self._send_command('reset')
+        self.state.clear()
+        self._pending.clear()  # there is no output to wait for
+        if self._tty:
+            self._close()
+
+    # raw=True returns the RGB565 frame as received, to be decoded later with decode_capture
+    def capture(self, raw=False) -> 'PIL.Image.Image':
         self._send_command("capture")
-        b = self.serial.read(320 * 240 * 2)
-        x = struct.unpack(">76800H", b)
-        arr = np.array(x, dtype=np.uint32)  # convert pixel format from 565(RGB) to 8888(RGBA)
-        arr = 0xFF000000 + ((arr & 0xF800) >> 8) + ((arr & 0x07E0) << 5) + ((arr & 0x001F) << 19)
-        image = PIL.Image.frombuffer('RGBA', (320, 240), arr, 'raw', 'RGBA', 0, 1)
+        try:
+            b = self._framer.read_exact(self.WIDTH * self.HEIGHT * 2)
+        except OSError as error:
+            self._lost(error)
         self._read_lines()  # clear out the remaining buffer
-        return image
+        if raw:
+            return b
+        return self._parse(self.decode_capture, b)
+
+    @staticmethod
+    def decode_capture(frame: bytes, out: np.array = None) -> 'PIL.Image.Image':
+        """
+        Converts the big-endian RGB565 frame to an RGBA image. The pixels are not unpacked or copied, their native
+        uint16 view of the received buffer indexes a table of every 565 value converted to 8888, byte swapped.
+
+        :param frame: capture output
+        :param out: Optional uint32 array of WIDTH * HEIGHT to decode into
+        """
+        global _RGBA_TABLE
+        if _RGBA_TABLE is None:
+            v = np.arange(1 << 16, dtype=np.uint32)
+            table = 0xFF000000 + ((v & 0xF800) >> 8) + ((v & 0x07E0) << 5) + ((v & 0x001F) << 19)
+            _RGBA_TABLE = table[v.astype(np.uint16).byteswap()]
+        pixels = np.frombuffer(frame, dtype=np.uint16)
+        arr = np.take(_RGBA_TABLE, pixels, out=out)
+        import PIL.Image
+        return PIL.Image.frombuffer('RGBA', (NanoVNA.WIDTH, NanoVNA.HEIGHT), arr, 'raw', 'RGBA', 0, 1)
 
     # data {0|1|2|3|4|5|6}
     # 0: S11
@@ -147,18 +514,14 @@ class NanoVNA:
     # 4: /* error term reflection tracking */
     # 5: /* error term transmission tracking */
     # 6: /* error term isolation */
-    def get_data(self, array=0) -> np.array:
+    #
+    # out can be a preallocated complex64 or complex128 array, that is filled in place for continuous monitoring
+    def get_data(self, array=0, out=None, dtype=np.complex128) -> np.array:
         if not 0 <= array <= 6:
             raise AttributeError('There are data arrays only from 0 to 6')
 
         self._send_command('data %d' % array)
-        lines = self._read_lines()
-        x = []
-        for line in lines:
-            if line:
-                d = line.split(' ')
-                x.append(float(d[0]) + float(d[1]) * 1.j)
-        return np.array(x)
+        return self._parse(parse_complex, self._read_block(), out, dtype)
 
     def get_info(self) -> [str]:
         self._send_command('info')
@@ -169,14 +532,175 @@ class NanoVNA:
         lines = self._read_lines()
         values = lines[0].split(' ')
         values = [int(n) for n in values]
-        return values[0], values[1], values[2]
+        self.state.set_sweep(values[0], values[1], values[2])
+        return self.state.sweep
+
+    @property
+    def sweep(self) -> (int, int, int):
+        """
+        The sweep start, stop and points, queried only when not known from an earlier get_sweep, set_sweep or set_scan.
+        """
+        return self.state.sweep or self.get_sweep()
+
+    # cal on|off applies or bypasses the device calibration, for example to correct raw data on the host
+    def set_calibration(self, enabled: bool):
+        self._send_command('cal %s' % ('on' if enabled else 'off'))
+        self._read_lines()
 
     # you should really recalibrate after changing the sweep
     def set_sweep(self, start, stop, points):
-        self._send_command('sweep %d %d %d' % (start, stop, points))
-        self._read_lines()
+        if self.skip_redundant and self.state.sweep == (int(start), int(stop), int(points)):
+            return
+        self._configure('sweep %d %d %d' % (start, stop, points))
+        self.state.set_sweep(start, stop, points)
 
     # sending scan command seems to call pause implicitly
     def set_scan(self, start, stop, points):
-        self._send_command('scan %d %d %d' % (start, stop, points))
-        self._read_lines()
+        self._configure('scan %d %d %d' % (start, stop, points))
+        self.state.set_sweep(start, stop, points)
+
+    def acquire(self, arrays=(0, 1), frequencies=True, dtype=np.complex128) -> Acquisition:
+        """
+        Reads any of the data arrays 0-6 from a single sweep. The device is paused once, and all the data commands
+        are sent in one pipelined burst with the resume. The frequencies are fetched in the same burst, unless
+        already known for the cached sweep.
+        """
+        for array in arrays:
+            if not 0 <= array <= 6:
+                raise AttributeError('There are data arrays only from 0 to 6')
+        sweep = self.sweep
+        fetch_frequencies = frequencies and self.state.frequencies is None
+        commands = ['pause'] + ['data %d' % array for array in arrays]
+        if fetch_frequencies:
+            commands.append('frequencies')
+        blocks = self._pipeline(commands + ['resume'])
+        timestamp = time.time()
+
+        data = {array: self._parse(parse_complex, block, None, dtype) for array, block in zip(arrays, blocks[1:])}
+        if fetch_frequencies:
+            self.state.frequencies = self._parse(parse_real, blocks[len(arrays) + 1])
+        return Acquisition(timestamp, sweep, self.state.frequencies if frequencies else None, data)
+
+    @staticmethod
+    def frequency_axis(start, stop, points) -> np.array:
+        """
+        The frequencies the device sweeps for the given range, computed on the host instead of querying them.
+        """
+        return np.rint(np.linspace(start, stop, points))
+
+    @staticmethod
+    def plan_segments(points, segment_points=SEGMENT_POINTS) -> [(int, int)]:
+        """
+        Splits a sweep of points into nearly equal segments the device can do in one scan. Balancing the lengths avoids
+        a short tail segment, that would cost a full round-trip for a couple of points.
+
+        :return: list of (first index, end index) slices of the full sweep
+        """
+        count = -(-points // segment_points)
+        bounds = np.linspace(0, points, count + 1).round().astype(int).tolist()
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    # Sweeps more points than the device can hold by scanning it segment by segment and stitching the results.
+    # The data of each segment is parsed in a worker thread while the device is already scanning the next segment.
+    # s11 and s21 can be preallocated complex arrays of points length. Pass False to skip fetching one of them.
+    # The sweep configured before the scan is set again, and the device resumed on it.
+    def scan(self, start, stop, points, s11=None, s21=None, dtype=np.complex128) -> (np.array, np.array, np.array):
+        frequencies = self.frequency_axis(start, stop, points)
+        arrays = []
+        for out in (s11, s21):
+            if out is None:
+                out = np.empty(points, dtype=dtype)
+            elif out is not False and len(out) != points:
+                raise AttributeError(f'Output arrays should have {points} points')
+            arrays.append(out)
+
+        sweep = self.sweep
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=1) as parser:
+            parsed = []
+            for first, end in self.plan_segments(points):
+                self.set_scan(frequencies[first], frequencies[end - 1], end - first)
+                for array, out in enumerate(arrays):
+                    if out is not False:
+                        self._send_command('data %d' % array)
+                        parsed.append(parser.submit(self._parse, parse_complex, self._read_block(), out[first:end]))
+            for future in parsed:
+                future.result()  # raise the parsing errors
+        self.set_sweep(*sweep)
+        self.resume()
+        return frequencies, arrays[0], arrays[1]
+
+
+class Batch:
+    """
+    Configuration commands written at once and drained in one pass, see NanoVNA.batch. The output of every command is
+    still checked, and all the failed ones are reported together in a CommandError after the whole batch has been
+    drained, so the connection stays in sync.
+    """
+
+    def __init__(self, vna: NanoVNA):
+        self.vna = vna
+        self.commands = []
+        self.results = None
+        self._updates = []  # state update of each command, applied once the command has succeeded
+        self._queued = None  # the state as it will be after the queued commands
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.commands, self._updates, self._queued = [], [], None
+
+    def command(self, cmd, update=None):
+        """
+        :param update: Called without arguments if the command succeeds
+        """
+        self.commands.append(cmd)
+        self._updates.append(update)
+
+    def _state(self) -> DeviceState:
+        if self._queued is None:
+            self._queued = DeviceState()
+            self._queued.traces = dict(self.vna.state.traces)
+            self._queued.markers = dict(self.vna.state.markers)
+        return self._queued
+
+    def set_marker(self, n: int, index):
+        if self._state().set_marker(n, index) or not self.vna.skip_redundant:
+            self.command('marker %d %s' % (n, index), functools.partial(self.vna.state.set_marker, n, index))
+
+    def set_trace(self, trace, trace_format, channel):
+        if self._state().set_trace(trace, trace_format, channel) or not self.vna.skip_redundant:
+            self.command('trace %s %s %s' % (trace, trace_format, channel),
+                         functools.partial(self.vna.state.set_trace, trace, trace_format, channel))
+
+    def pause(self):
+        self.command('pause')
+
+    def resume(self):
+        self.command('resume')
+
+    def execute(self) -> [[str]]:
+        """
+        :return: Output lines of each command
+        """
+        commands, self.commands = self.commands, []
+        updates, self._updates = self._updates, []
+        self._queued = None
+        if not commands:
+            return []
+        self.results = []
+        errors = []
+        for cmd, update, block in zip(commands, updates, self.vna._pipeline(commands)):
+            lines = [line.strip() for line in block.decode('utf-8').split('\n')[:-1]]
+            self.results.append(lines)
+            if _failed(cmd, lines):
+                errors.append((cmd, lines))
+            elif update is not None:
+                update()
+        if errors:
+            raise CommandError(errors)
+        return self.results
@@ -0,0 +1,89 @@
+class Framer:
+    """
+    Splits the NanoVNA shell output into lines, prompts and binary payloads.
+
+    Reading the serial port one byte at a time costs a syscall and a few Python calls per byte. The framer instead
+    pulls everything the driver has already buffered (``in_waiting``) in one read, appends it to a single reusable
+    buffer and does the line and prompt scanning on that buffer.
+
+    The shell output for one command looks like ``<echo>\\r\\n<line>\\r\\n...<line>\\r\\nch> ``. The prompt has no
+    newline after it, so it can only be recognized when it starts a line.
+    """
+    PROMPT = b'ch> '
+    NEWLINE_PROMPT = b'\n' + PROMPT
+
+    def __init__(self, serial):
+        self.serial = serial
+        self._buffer = bytearray()
+        self.received = 0
+
+    @property
+    def consumed(self) -> int:
+        """
+        Bytes read from the serial port and already framed, for counting the output of each command.
+        """
+        return self.received - len(self._buffer)
+
+    def _fill(self):
+        # Blocks for at least one byte, but takes everything else that is already waiting in the same call
+        waiting = self.serial.in_waiting
+        data = self.serial.read(waiting if waiting > 0 else 1)
+        self.received += len(data)
+        self._buffer += data
+
+    def _consume(self, n) -> bytes:
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def read_line(self) -> bytes:
+        """
+        Reads one line including the line ending. Returns b'' when the line is the prompt.
+        """
+        searched = 0
+        while True:
+            if self._buffer.startswith(self.PROMPT):
+                del self._buffer[:len(self.PROMPT)]
+                return b''
+            end = self._buffer.find(b'\n', searched)
+            if end >= 0:
+                return self._consume(end + 1)
+            searched = len(self._buffer)
+            self._fill()
+
+    def read_block(self) -> bytes:
+        """
+        Reads all the lines up to the next prompt as a single block. The prompt is consumed, but not returned.
+        """
+        if self._buffer.startswith(self.PROMPT):
+            del self._buffer[:len(self.PROMPT)]
+            return b''
+        searched = 0
+        while True:
+            end = self._buffer.find(self.NEWLINE_PROMPT, searched)
+            if end >= 0:
+                block = self._consume(end + 1)
+                del self._buffer[:len(self.PROMPT)]
+                return block
+            # the prompt might be split between two reads
+            searched = max(0, len(self._buffer) - len(self.NEWLINE_PROMPT) + 1)
+            self._fill()
+            if self._buffer.startswith(self.PROMPT):
+                del self._buffer[:len(self.PROMPT)]
+                return b''
+
+    def read_exact(self, size) -> bytes:
+        """
+        Reads exactly size bytes, for example the capture binary, which has no framing of its own.
+        """
+        buffered = len(self._buffer)
+        if buffered >= size:
+            return self._consume(size)
+        data = self.serial.read(size - buffered)
+        self.received += len(data)
+        if not buffered:
+            return data  # as read, without copying
+        # the start of the payload, buffered while reading the echo, and the rest joined in a single copy
+        data = b''.join((self._buffer, data))
+        self._buffer.clear()
+        return data
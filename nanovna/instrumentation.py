@@ -0,0 +1,100 @@
+import bisect
+import threading
+import time
+
+# Upper edges of the round-trip latency histogram buckets in seconds, 100 us doubling up to 13 s, then the rest
+BUCKETS = [1e-4 * 2 ** i for i in range(18)]
+
+
+class CommandStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'seconds': self.seconds,
+            'mean': self.seconds / self.count if self.count else None,
+            'min': self.min if self.count else None,
+            'max': self.max,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'bytes_per_second': self.bytes_in / self.seconds if self.seconds else None,
+            'histogram': list(self.histogram),
+        }
+
+
+class Instrumentation:
+    """
+    Per-command round-trip latency, transferred bytes, parse time and protocol errors of a NanoVNA.
+
+    Pass one to NanoVNA(instrumentation=...) to enable it. Without it the driver only does a None check per command.
+    Hooks are called with a dict of every finished command, for example to feed a metrics system.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.commands = {}
+            self.parses = 0
+            self.parse_seconds = 0.0
+            self.protocol_errors = 0
+            self.started = time.time()
+
+    def command(self, name, seconds, bytes_out, bytes_in, error=False):
+        with self._lock:
+            stats = self.commands.get(name)
+            if stats is None:
+                stats = self.commands[name] = CommandStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.min = min(stats.min, seconds)
+            stats.max = max(stats.max, seconds)
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            stats.histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+            if error:
+                stats.errors += 1
+                self.protocol_errors += 1
+        for hook in self.hooks:
+            hook({'command': name, 'seconds': seconds, 'bytes_out': bytes_out, 'bytes_in': bytes_in, 'error': error})
+
+    def parse(self, seconds):
+        with self._lock:
+            self.parses += 1
+            self.parse_seconds += seconds
+
+    def protocol_error(self):
+        """
+        Counts an error that isn't an answer to a command, like a lost prompt.
+        """
+        with self._lock:
+            self.protocol_errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            commands = {name: stats.snapshot() for name, stats in self.commands.items()}
+            return {
+                'since': self.started,
+                'buckets': BUCKETS,
+                'commands': commands,
+                'count': sum(c['count'] for c in commands.values()),
+                'bytes_out': sum(c['bytes_out'] for c in commands.values()),
+                'bytes_in': sum(c['bytes_in'] for c in commands.values()),
+                'parses': self.parses,
+                'parse_seconds': self.parse_seconds,
+                'protocol_errors': self.protocol_errors,
+            }
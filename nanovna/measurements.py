@@ -1,67 +1,161 @@
+import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy
 
+from .averaging import SweepAccumulator
+
 
 class Measurements:
 
-    def __init__(self, vna, directory, prefix):
+    def __init__(self, vna, directory, prefix, background=False, settle_timeout=3.0, catalogue=None, tags=(),
+                 averages=1, render=False):
+        """
+        :param settle_timeout: Longest time to wait for the device to settle after changing the traces or the sweep
+        :param background: Decode and compress the screen captures to PNG in a worker thread, so the next sweep
+            doesn't wait for them. Call wait() or close() to make sure the files are written.
+        :param catalogue: Optional nanovna.catalogue.Catalogue of the directory to index every saved sweep in
+        :param tags: Tags of the saved sweeps in the catalogue, the view name is added to them
+        :param averages: Sweeps averaged into the saved data, each one a new scan
+        :param render: Draw the views on the host from the data, instead of capturing the screen. True to render in a
+            nanovna.plotting.Renderer of its own, or a Renderer to share. Without matplotlib the screen is captured.
+        """
         self.vna = vna
         self.directory = directory
         self.prefix = prefix
+        self.settle_timeout = settle_timeout
+        self.catalogue = catalogue
+        self.tags = tuple(tags)
+        self.averages = averages
+        self.accumulator = None  # statistics of the last saved data, when averaging
         if not os.path.isdir(directory):
             raise AttributeError(f'{directory} is not a directory')
+        self._encoder = ThreadPoolExecutor(max_workers=1) if background else None
+        self._pending = []
+        self.renderer = None
+        self._own_renderer = render is True
+        if render is True:
+            from .plotting import Renderer
+            try:
+                self.renderer = Renderer()
+            except ImportError as e:
+                logging.warning('%s, capturing the screen instead', e)
+        elif render:
+            self.renderer = render
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _save_png(self, frame, path):
+        self.vna.decode_capture(frame).save(path, 'PNG')
+
+    def wait(self):
+        """
+        Waits for the background PNG encoding to finish, raising its errors.
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+        if self.renderer is not None:
+            self.renderer.wait()
+
+    def close(self):
+        if self._encoder:
+            self.wait()
+            self._encoder.shutdown()
+            self._encoder = None
+        if self.renderer is not None and self._own_renderer:
+            self.renderer.close()
+            self.renderer = None
+
+    def _settle(self):
+        # only the screen capture needs the traces on the screen, they are drawn by the next complete sweep
+        if self.renderer is None:
+            self.vna.settle(timeout=self.settle_timeout, sweeps=1)
+
+    def _save_screen(self, path):
+        # the screen still shows the last sweep drawn before the scan, with the traces already settled
+        if self._encoder:
+            self._pending = [future for future in self._pending if not future.done() or future.exception()]
+            self._pending.append(self._encoder.submit(self._save_png, self.vna.capture(raw=True), path))
+        else:
+            self.vna.capture().save(path, 'PNG')
 
     def _save_data(self, suffix):
-        start, stop, points = self.vna.get_sweep()
-        self.vna.set_scan(start, stop, points)
-        time.sleep(0.5)
-        capture = self.vna.capture()
-        capture.save(f'{self.directory}/{self.prefix}-{suffix}.png', 'PNG')
+        start, stop, points = self.vna.sweep
+        self.vna.set_scan(start, stop, points)  # paused after the scan, so the data doesn't change any more
+        path = f'{self.directory}/{self.prefix}-{suffix}.png'
+        if self.renderer is None:
+            self._save_screen(path)
 
         data = self.vna.get_data()
+        if self.averages > 1:
+            data = self._average(data, start, stop, points)
+        timestamp = time.time()
         numpy.save(f'{self.directory}/{self.prefix}-{suffix}.npy', data)
         self.vna.resume()
+        if self.renderer is not None:
+            self.renderer.submit(suffix, self.vna.frequency_axis(start, stop, points), data, path,
+                                 f'{self.prefix} {suffix}')
+        if self.catalogue is not None:
+            self.catalogue.add(f'{self.directory}/{self.prefix}-{suffix}.npy', path, (start, stop, points), timestamp,
+                               self.tags + (suffix,), self.prefix)
+
+    def _average(self, data, start, stop, points) -> numpy.array:
+        self.accumulator = SweepAccumulator(points)
+        self.accumulator.add(data)
+        for _ in range(self.averages - 1):
+            self.vna.set_scan(start, stop, points)  # scan sweeps once more and stays paused
+            self.accumulator.add(self.vna.get_data(out=data))
+        return self.accumulator.mean.copy()
 
     def clear_screen(self):
-        self.vna.pause()
-        self.vna.set_trace('all', 'off', 0)
-        self.vna.set_trace('all', 'off', 1)
-        self.vna.set_marker(1, 'off')
-        self.vna.set_marker(2, 'off')
-        self.vna.set_marker(3, 'off')
-        self.vna.set_marker(4, 'off')
-        self.vna.resume()  # refresh the screen to show the blanking
-        time.sleep(0.5)
+        with self.vna.batch() as batch:
+            batch.pause()
+            batch.set_trace('all', 'off', 0)
+            batch.set_trace('all', 'off', 1)
+            batch.set_marker(1, 'off')
+            batch.set_marker(2, 'off')
+            batch.set_marker(3, 'off')
+            batch.set_marker(4, 'off')
+            batch.resume()  # refresh the screen to show the blanking
+        self._settle()
 
     def polar(self):
-        self.vna.resume()
-        self.vna.set_trace(0, 'polar', 0)
-        self.vna.set_trace(1, 'linear', 0)
-        self.vna.set_trace(2, 'real', 0)
-        self.vna.set_trace(3, 'imag', 0)
-        time.sleep(1)
+        with self.vna.batch() as batch:
+            batch.resume()
+            batch.set_trace(0, 'polar', 0)
+            batch.set_trace(1, 'linear', 0)
+            batch.set_trace(2, 'real', 0)
+            batch.set_trace(3, 'imag', 0)
+        self._settle()
 
         self._save_data('polar')
 
     def smith(self):
-        self.vna.resume()
-        self.vna.set_trace(0, 'logmag', 0)
-        self.vna.set_trace(1, 'phase', 0)
-        self.vna.set_trace(2, 'delay', 0)
-        self.vna.set_trace(3, 'smith', 0)
-        time.sleep(1)
+        with self.vna.batch() as batch:
+            batch.resume()
+            batch.set_trace(0, 'logmag', 0)
+            batch.set_trace(1, 'phase', 0)
+            batch.set_trace(2, 'delay', 0)
+            batch.set_trace(3, 'smith', 0)
+        self._settle()
 
         self._save_data('smith')
 
     def swr(self):
-        self.vna.resume()
-        self.vna.set_trace(0, 'swr', 0)
-        self.vna.set_trace(1, 'r', 0)
-        self.vna.set_trace(2, 'x', 0)
-        self.vna.set_trace(3, 'q', 0)
-        time.sleep(1)
+        with self.vna.batch() as batch:
+            batch.resume()
+            batch.set_trace(0, 'swr', 0)
+            batch.set_trace(1, 'r', 0)
+            batch.set_trace(2, 'x', 0)
+            batch.set_trace(3, 'q', 0)
+        self._settle()
 
         self._save_data('swr')
 
@@ -0,0 +1,45 @@
+# Vectorized parsing of the shell output blocks. The whole block up to the prompt is parsed in one numpy pass instead
+# of decoding, splitting and converting every line in Python.
+
+import numpy as np
+
+
+def _parse_floats(block: bytes, columns: int) -> np.ndarray:
+    values = np.fromstring(block, dtype=np.float64, sep=' ')
+    # older numpy stops at unparsable text, like a 'usage:' line, with only a DeprecationWarning, so the count is
+    # checked against the lines instead of relying on fromstring to raise
+    lines = block.count(b'\n')
+    if values.size != columns * lines:
+        raise ValueError(f'Expected {columns} values per line, got {values.size} values on {lines} lines')
+    return values
+
+
+def parse_complex(block: bytes, out: np.ndarray = None, dtype=np.complex128) -> np.ndarray:
+    """
+    Parses the `data` output, lines of '<real> <imag>', into a complex array.
+
+    :param block: Output of the command up to the prompt
+    :param out: Optional complex64 or complex128 array to write the result to, so that repeated sweeps don't allocate
+    :param dtype: complex64 or complex128, when out is not given
+    :return: out, or a new array
+    """
+    values = _parse_floats(block, 2)
+    if out is None:
+        out = np.empty(values.size // 2, dtype=dtype)
+    if out.shape != (values.size // 2,) or out.dtype.kind != 'c' or not out.flags.c_contiguous:
+        raise ValueError(f'Output array should be a contiguous complex array of {values.size // 2} points')
+    out.view(out.real.dtype)[:] = values
+    return out
+
+
+def parse_real(block: bytes, out: np.ndarray = None, dtype=np.float64) -> np.ndarray:
+    """
+    Parses output with a single value per line, like `frequencies`, into a float array.
+    """
+    values = _parse_floats(block, 1)
+    if out is None:
+        return values.astype(dtype, copy=False)
+    if out.shape != values.shape:
+        raise ValueError(f'Output array has shape {out.shape}, expected {values.shape}')
+    out[:] = values
+    return out
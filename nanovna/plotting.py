@@ -0,0 +1,134 @@
+# Host rendered versions of the polar, smith and swr screens of Measurements, drawn from the data arrays instead of
+# capturing the 320x240 screen over USB. The four traces of each view are drawn as a 2x2 grid at any resolution.
+#
+# The rendering uses the matplotlib Agg canvas directly, without pyplot and its global state, and runs in worker
+# processes, so the measurement loop only sends the data over and doesn't wait for the drawing or the PNG encoding.
+# matplotlib is imported only in the workers and by render().
+
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import analysis
+
+VIEWS = ('polar', 'smith', 'swr')
+
+
+def _circle(ax, centre, radius, **kwargs):
+    t = np.linspace(0, 2 * np.pi, 361)
+    ax.plot(centre.real + radius * np.cos(t), centre.imag + radius * np.sin(t), **kwargs)
+
+
+def _complex_plane(ax, s11, smith):
+    grid = {'color': '0.8', 'linewidth': 0.6}
+    _circle(ax, 0, 1, color='0.5', linewidth=0.8)
+    if smith:
+        for r in (0.2, 0.5, 1, 2, 5):
+            _circle(ax, r / (1 + r), 1 / (1 + r), **grid)
+        for x in (0.2, 0.5, 1, 2, 5):
+            for sign in (1, -1):
+                # the reactance arcs, clipped to the unit circle
+                t = np.linspace(0, 2 * np.pi, 721)
+                arc = 1 + 1j * sign / x + (1 / x) * np.exp(1j * t)
+                arc[np.abs(arc) > 1.0001] = np.nan
+                ax.plot(arc.real, arc.imag, **grid)
+        ax.axhline(0, **grid)
+    else:
+        for radius in (0.25, 0.5, 0.75):
+            _circle(ax, 0, radius, **grid)
+        ax.axhline(0, **grid)
+        ax.axvline(0, **grid)
+    ax.plot(s11.real, s11.imag)
+    ax.plot(s11.real[:1], s11.imag[:1], 'o', markersize=3)
+    ax.set_xlim(-1.05, 1.05)
+    ax.set_ylim(-1.05, 1.05)
+    ax.set_aspect('equal')
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+
+def _traces(view, frequencies, s11) -> [(str, np.array)]:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if view == 'polar':
+            return [('S11 polar', None), ('|S11|', analysis.linmag(s11)),
+                    ('Re S11', s11.real), ('Im S11', s11.imag)]
+        if view == 'smith':
+            return [('S11 dB', analysis.logmag(s11)), ('S11 phase (deg)', analysis.phase(s11)),
+                    ('S11 group delay (ns)', analysis.groupdelay(s11, frequencies) * 1e9), ('S11 smith', None)]
+        if view == 'swr':
+            return [('SWR', analysis.vswr(s11)), ('R (ohm)', analysis.resistance(s11)),
+                    ('X (ohm)', analysis.reactance(s11)), ('Q', analysis.q(s11))]
+    raise AttributeError(f'View should be one of {VIEWS}')
+
+
+def render(view, frequencies, s11, path, size=(12, 9), dpi=100, title=None):
+    """
+    Draws the view of S11 and saves it as PNG.
+
+    :param view: One of VIEWS, the same traces as the Measurements method of the same name
+    :param size: Figure size in inches, the image is size * dpi pixels
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    s11 = np.asarray(s11)
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(2, 2).ravel()
+    for ax, (name, values) in zip(axes, _traces(view, frequencies, s11)):
+        ax.set_title(name)
+        if values is None:
+            _complex_plane(ax, s11, smith=name.endswith('smith'))
+        else:
+            ax.plot(frequencies / 1e6, values)
+            ax.set_xlabel('MHz')
+            ax.grid(True, color='0.85')
+            if view == 'swr' and name == 'SWR':
+                ax.set_ylim(1, min(10, np.nanmax(values[np.isfinite(values)], initial=1) * 1.1))
+    if title:
+        figure.suptitle(title)
+    figure.tight_layout()
+    figure.savefig(path, format='png')
+
+
+class Renderer:
+    """
+    Renders views in a pool of worker processes. submit() returns at once, wait() or close() makes sure the files
+    are written and raises the rendering errors.
+    """
+
+    def __init__(self, processes=None, size=(12, 9), dpi=100):
+        if importlib.util.find_spec('matplotlib') is None:  # fail here rather than in the workers
+            raise ImportError('Rendering needs matplotlib')
+        self.size = size
+        self.dpi = dpi
+        self._pool = ProcessPoolExecutor(max_workers=processes)
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, view, frequencies, s11, path, title=None):
+        if view not in VIEWS:
+            raise AttributeError(f'View should be one of {VIEWS}')
+        self._pending = [future for future in self._pending if not future.done() or future.exception()]
+        future = self._pool.submit(render, view, np.asarray(frequencies), np.asarray(s11), path, self.size,
+                                   self.dpi, title)
+        self._pending.append(future)
+        return future
+
+    def wait(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        if self._pool is not None:
+            self.wait()
+            self._pool.shutdown()
+            self._pool = None
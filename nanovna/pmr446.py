@@ -0,0 +1,91 @@
+# PMR446 channel monitoring. The 16 analogue channels are 12.5 kHz apart from 446.00625 MHz to 446.19375 MHz.
+# Instead of a generic 101 point sweep, only the channel centres, or a small oversampled grid around them, are scanned
+# and transferred, and each sweep is reduced to a fixed size record of per channel metrics.
+
+import time
+
+import numpy as np
+
+from . import analysis
+from .device import NanoVNA
+from .parsing import parse_complex
+
+FIRST_CHANNEL = 446.00625e6
+CHANNEL_SPACING = 12.5e3
+CHANNEL_COUNT = 16
+CHANNELS = FIRST_CHANNEL + CHANNEL_SPACING * np.arange(CHANNEL_COUNT)
+
+# One sweep: S11 at the channel centres, and the worst SWR and return loss within each channel
+RECORD = np.dtype([
+    ('timestamp', '<f8'),
+    ('s11', '<c8', (CHANNEL_COUNT,)),
+    ('swr', '<f4', (CHANNEL_COUNT,)),
+    ('return_loss', '<f4', (CHANNEL_COUNT,)),
+])
+
+
+class ChannelMonitor:
+    """
+    Sweeps the channel grid with the scan command. The scan and the data transfer are pipelined into one round-trip
+    per sweep. The device is left paused on the channel grid while monitoring, close() sets the sweep configured
+    before the monitoring again and resumes it.
+    """
+
+    def __init__(self, vna: NanoVNA, oversample=1):
+        """
+        :param oversample: Points per channel spacing, 1 sweeps the 16 channel centres only
+        """
+        self.vna = vna
+        self.points = (CHANNEL_COUNT - 1) * oversample + 1
+        if oversample < 1 or self.points > NanoVNA.SEGMENT_POINTS:
+            most = (NanoVNA.SEGMENT_POINTS - 1) // (CHANNEL_COUNT - 1)
+            raise AttributeError(f'Oversample should be from 1 to {most}')
+        self.oversample = oversample
+        self._sweep = vna.sweep  # restored by close()
+        self.frequencies = NanoVNA.frequency_axis(CHANNELS[0], CHANNELS[-1], self.points)
+        self._command = 'scan %d %d %d' % (CHANNELS[0], CHANNELS[-1], self.points)
+        self._data = np.empty(self.points, dtype=np.complex64)
+        # grid points within half a spacing from each channel centre, the edge points are shared by two channels
+        half = oversample // 2
+        centres = np.arange(CHANNEL_COUNT) * oversample
+        self._windows = np.clip(centres[:, None] + np.arange(-half, half + 1), 0, self.points - 1)
+        self._centres = centres
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sweep(self, out=None) -> np.void:
+        """
+        Scans the channel grid once.
+
+        :param out: Optional RECORD array element to fill
+        """
+        blocks = self.vna._pipeline([self._command, 'data 0'])
+        self.vna.state.set_sweep(CHANNELS[0], CHANNELS[-1], self.points)
+        parse_complex(blocks[1], self._data)
+        if out is None:
+            out = np.zeros((), dtype=RECORD)
+        out['timestamp'] = time.time()
+        out['s11'] = self._data[self._centres]
+        worst = np.abs(self._data)[self._windows].max(axis=1)
+        out['swr'] = analysis.vswr(worst)
+        out['return_loss'] = analysis.return_loss(worst)
+        return out
+
+    def run(self, count, interval=0.0) -> np.array:
+        """
+        :return: RECORD array of count sweeps
+        """
+        records = np.zeros(count, dtype=RECORD)
+        for i in range(count):
+            begin = time.monotonic()
+            self.sweep(records[i:i + 1].reshape(()))
+            time.sleep(max(0.0, interval - (time.monotonic() - begin)))
+        return records
+
+    def close(self):
+        self.vna.set_sweep(*self._sweep)
+        self.vna.resume()
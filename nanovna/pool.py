@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .device import NanoVNA
+
+PoolResult = namedtuple('PoolResult', 'device timestamp value error')
+
+
+def sweep(vna: NanoVNA, arrays=(0, 1)) -> {int: object}:
+    """
+    Default pool task, reads the data arrays of one sweep in a single pipelined pause and resume.
+    """
+    return vna.acquire(arrays, frequencies=False).data
+
+
+class DevicePool:
+    """
+    Drives several NanoVNAs in parallel, one worker thread per device. The time is spent waiting on the serial ports,
+    which releases the GIL, so threads are enough for the aggregate throughput to grow with the number of devices.
+
+    Results are tagged with the name of the device they came from, the tty for the discovered devices. The USB serial
+    numbers can't be used, as the units usually all report the same one.
+    """
+
+    def __init__(self, devices: {str: object} = None):
+        """
+        :param devices: tty or serial-like object by name. All connected NanoVNAs by tty when omitted.
+        """
+        if devices is None:
+            devices = {tty: tty for tty in NanoVNA.get_ttys()}
+        if not devices:
+            raise OSError("USB device not found")
+        self.devices = {name: NanoVNA(dev) for name, dev in devices.items()}
+        self.results = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.devices), thread_name_prefix='nanovna-pool')
+        self._threads = []
+        self._stop = threading.Event()
+        self._barrier = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.devices)
+
+    @staticmethod
+    def _run(name, vna, function, *args) -> PoolResult:
+        try:
+            return PoolResult(name, time.time(), function(vna, *args), None)
+        except Exception as e:
+            logging.exception('%s failed', name)
+            return PoolResult(name, time.time(), None, e)
+
+    def map(self, function=sweep, *args) -> [PoolResult]:
+        """
+        Runs function(vna, *args) on every device at the same time and waits for all of them.
+        """
+        futures = [self._executor.submit(self._run, name, vna, function, *args)
+                   for name, vna in self.devices.items()]
+        return [future.result() for future in futures]
+
+    def start(self, function=sweep, *args, interval=0.0, count=None, synchronized=False):
+        """
+        Runs function(vna, *args) repeatedly on every device in the background and puts the results to self.results.
+
+        :param interval: Minimum seconds between the starts of two runs on a device
+        :param count: Number of runs per device, forever when None
+        :param synchronized: Start the runs of all devices together, otherwise each device runs at its own pace
+        """
+        barrier = self._barrier = threading.Barrier(len(self.devices)) if synchronized else None
+        self._stop.clear()
+
+        def schedule(name, vna):
+            n = 0
+            while not self._stop.is_set() and (count is None or n < count):
+                begin = time.monotonic()
+                if barrier:
+                    try:
+                        barrier.wait()
+                    except threading.BrokenBarrierError:
+                        return
+                self.results.put(self._run(name, vna, function, *args))
+                n += 1
+                self._stop.wait(max(0.0, interval - (time.monotonic() - begin)))
+
+        for name, vna in self.devices.items():
+            thread = threading.Thread(target=schedule, args=(name, vna), daemon=True,
+                                      name=f'nanovna-{name}')
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        """
+        Waits until the runs started with a count have finished.
+        """
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stop(self):
+        self._stop.set()
+        if self._barrier:
+            self._barrier.abort()  # release the devices waiting for a round that won't start
+        self.join()
+
+    def close(self):
+        self.stop()
+        self._executor.shutdown()
+        for vna in self.devices.values():
+            vna._close()
@@ -0,0 +1,203 @@
+# Continuous recording of sweeps to a single append-only, memory-mapped file.
+#
+# File layout:
+#   header       HEADER dtype, the record count is updated after each complete sweep
+#   frequencies  float64 x points
+#   records      RECORD_ALIGN aligned array of (timestamp float64, data complex64 x arrays x points)
+#
+# The file is preallocated for capacity sweeps and grown by another capacity when full. Sweeps are written straight
+# into the mapped records, so the process memory doesn't grow with the recording. Readers map the same file read only
+# and see every sweep up to the header count.
+
+import time
+
+import numpy as np
+
+MAGIC = b'NVREC\x00\x01\x00'
+RECORD_ALIGN = 4096
+
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('arrays', '<u4'),
+    ('points', '<u8'),
+    ('count', '<u8'),
+    ('capacity', '<u8'),
+    ('start', '<f8'),
+    ('stop', '<f8'),
+    ('created', '<f8'),
+    ('array_ids', 'u1', (8,)),
+])
+
+
+def _record_dtype(arrays, points) -> np.dtype:
+    return np.dtype([('timestamp', '<f8'), ('data', '<c8', (arrays, points))])
+
+
+def _records_offset(points) -> int:
+    end = HEADER.itemsize + 8 * points
+    return -(-end // RECORD_ALIGN) * RECORD_ALIGN
+
+
+class SweepRecorder:
+    """
+    Appends sweeps to a recording file. The sweep is stored as complex64, arrays are the `data` array numbers.
+    """
+
+    def __init__(self, path, frequencies, arrays=(0,), capacity=4096, flush_every=100, detector=None):
+        """
+        :param path: Recording file, overwritten
+        :param frequencies: Frequency axis of the sweeps
+        :param arrays: Data array numbers stored per sweep, 0 for S11, 1 for S21, ...
+        :param capacity: Sweeps preallocated at a time
+        :param flush_every: Sweeps between flushing the mapped pages to disk
+        :param detector: Optional nanovna.changes.ChangeDetector, only the sweeps it accepts are stored
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if not 1 <= len(arrays) <= 8:
+            raise AttributeError('From 1 to 8 data arrays can be recorded')
+        self.path = path
+        self.arrays = tuple(arrays)
+        self.points = len(frequencies)
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.detector = detector
+        self._record = _record_dtype(len(self.arrays), self.points)
+        self._offset = _records_offset(self.points)
+
+        with open(path, 'wb') as f:
+            f.truncate(self._offset + capacity * self._record.itemsize)
+        self._header = np.memmap(path, dtype=HEADER, mode='r+', shape=())
+        self._header['magic'] = MAGIC
+        self._header['version'] = 1
+        self._header['arrays'] = len(self.arrays)
+        self._header['points'] = self.points
+        self._header['capacity'] = capacity
+        self._header['start'] = frequencies[0]
+        self._header['stop'] = frequencies[-1]
+        self._header['created'] = time.time()
+        self._header['array_ids'][:len(self.arrays)] = self.arrays
+        np.memmap(path, dtype=np.float64, mode='r+', offset=HEADER.itemsize, shape=self.points)[:] = frequencies
+        self.count = 0
+        self._records = self._map()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _map(self) -> np.memmap:
+        return np.memmap(self.path, dtype=self._record, mode='r+', offset=self._offset,
+                         shape=int(self._header['capacity']))
+
+    def _grow(self):
+        self._records.flush()
+        del self._records
+        capacity = int(self._header['capacity']) + self.capacity
+        with open(self.path, 'r+b') as f:
+            f.truncate(self._offset + capacity * self._record.itemsize)
+        self._header['capacity'] = capacity
+        self._records = self._map()
+
+    def _reserve(self) -> int:
+        if self.count == len(self._records):
+            self._grow()
+        return self.count
+
+    def _commit(self, index):
+        self.count = index + 1
+        self._header['count'] = self.count  # readers only look up to count, so this publishes the sweep
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def append(self, data, timestamp=None) -> int:
+        """
+        Appends one sweep, data has one row per recorded array.
+
+        :return: Index of the sweep, None if the detector skipped it
+        """
+        data = np.reshape(data, (len(self.arrays), self.points))
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.detector is not None and not self.detector.update(data, timestamp):
+            return None
+        index = self._reserve()
+        self._records['data'][index] = data
+        self._records['timestamp'][index] = timestamp
+        self._commit(index)
+        return index
+
+    def record(self, vna, count=None, duration=None, interval=0.0):
+        """
+        Records sweeps from the device until count sweeps or duration seconds. The data is parsed straight into the
+        mapped file without intermediate arrays. With a detector, count is the number of sweeps taken, and a skipped
+        sweep is overwritten by the next one.
+        """
+        end = None if duration is None else time.monotonic() + duration
+        recorded = 0
+        while (count is None or recorded < count) and (end is None or time.monotonic() < end):
+            begin = time.monotonic()
+            index = self._reserve()
+            data = self._records['data'][index]
+            vna.pause()
+            try:
+                for row, array in enumerate(self.arrays):
+                    vna.get_data(array, out=data[row])
+            finally:
+                vna.resume()
+            timestamp = time.time()
+            if self.detector is None or self.detector.update(data, timestamp):
+                self._records['timestamp'][index] = timestamp
+                self._commit(index)
+            recorded += 1
+            time.sleep(max(0.0, interval - (time.monotonic() - begin)))
+
+    def flush(self):
+        self._records.flush()
+        self._header.flush()
+
+    def close(self):
+        if self._records is not None:
+            self.flush()
+            self._records = None
+            self._header = None
+
+
+class Recording:
+    """
+    Read only, zero-copy view of a recording file. It can be opened while the recorder is still writing to it,
+    refresh() maps the sweeps recorded since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = np.memmap(path, dtype=HEADER, mode='r', shape=())
+        if self.header['magic'] != MAGIC:
+            raise OSError(f'{path} is not a sweep recording')
+        self.points = int(self.header['points'])
+        self.arrays = tuple(int(a) for a in self.header['array_ids'][:int(self.header['arrays'])])
+        self.frequencies = np.memmap(path, dtype=np.float64, mode='r', offset=HEADER.itemsize, shape=self.points)
+        self._record = _record_dtype(len(self.arrays), self.points)
+        self._offset = _records_offset(self.points)
+        self.records = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self.records)
+
+    def refresh(self):
+        count = int(self.header['count'])
+        if count == 0:
+            self.records = np.zeros(0, dtype=self._record)
+        elif self.records is None or count != len(self.records):
+            self.records = np.memmap(self.path, dtype=self._record, mode='r', offset=self._offset, shape=count)
+
+    @property
+    def timestamps(self) -> np.array:
+        return self.records['timestamp']
+
+    def data(self, array=0) -> np.array:
+        """
+        :return: sweeps x points view of one recorded data array
+        """
+        return self.records['data'][:, self.arrays.index(array)]
@@ -0,0 +1,147 @@
+# Adaptive coarse-to-fine sweeps. A coarse scan over the whole span finds the features, like the |S11| minimum of an
+# antenna or the -3 dB edges of a filter, and only narrow windows around them are scanned again, each time narrower
+# and finer, until the point spacing is below the wanted resolution. The result is a single non-uniform frequency
+# axis with a few hundred points, that resolves the features as well as a dense sweep of millions of points would.
+#
+# Features narrower than a couple of coarse steps can be missed by the coarse scan, more coarse points help then.
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import analysis
+from .device import NanoVNA
+
+# kind of the feature, its frequency and the data interpolated at that frequency
+Feature = namedtuple('Feature', 'kind frequency value')
+# merged frequencies and data of all the scans, sorted, and the located features
+Refinement = namedtuple('Refinement', 'frequencies data features')
+
+KINDS = ('minimum', 'edges', 'phase', 'resonance')
+
+
+def crossings(frequencies, values, level=0.0) -> np.array:
+    """
+    Frequencies where the values cross the level, interpolated linearly between the points.
+    """
+    d = np.asarray(values) - level
+    i = np.flatnonzero(np.signbit(d[:-1]) != np.signbit(d[1:]))
+    return frequencies[i] + (frequencies[i + 1] - frequencies[i]) * d[i] / (d[i] - d[i + 1])
+
+
+def minimum(frequencies, data) -> np.array:
+    """
+    Frequency of the smallest magnitude, refined with a parabola through the neighbouring points.
+    """
+    m = np.abs(data)
+    i = int(m.argmin())
+    if 0 < i < len(m) - 1:
+        denominator = m[i - 1] - 2 * m[i] + m[i + 1]
+        if denominator > 0:
+            offset = 0.5 * (m[i - 1] - m[i + 1]) / denominator
+            step = frequencies[i + 1] - frequencies[i] if offset > 0 else frequencies[i] - frequencies[i - 1]
+            return np.array([frequencies[i] + offset * step])
+    return frequencies[i:i + 1]
+
+
+def edges(frequencies, data, level) -> np.array:
+    """
+    Frequencies where the magnitude crosses the level in dB, the -3 dB points with a level 3 dB below the peak.
+    """
+    return crossings(frequencies, analysis.logmag(data), level)
+
+
+def phase_zeros(frequencies, data) -> np.array:
+    """
+    Frequencies where the phase of the data crosses zero, for example of S21 through a filter. The jumps from -180 to
+    180 degrees are not crossings.
+    """
+    phase = np.angle(data)
+    found = crossings(frequencies, phase)
+    i = np.flatnonzero(np.signbit(phase[:-1]) != np.signbit(phase[1:]))
+    return found[np.abs(phase[i] - phase[i + 1]) < np.pi]
+
+
+def resonances(frequencies, data) -> np.array:
+    """
+    Frequencies where the reactance of the load crosses zero, from S11. Poles, where the reactance jumps from a large
+    positive to a large negative value, are not resonances here.
+    """
+    x = analysis.reactance(data)
+    found = crossings(frequencies, x)
+    i = np.flatnonzero(np.signbit(x[:-1]) != np.signbit(x[1:]))
+    return found[x[i] < x[i + 1]]
+
+
+def locate(kind, frequencies, data, level=None) -> np.array:
+    """
+    :param kind: One of KINDS
+    :param level: Level of the edges in dB, 3 dB below the largest magnitude of the data by default
+    """
+    if kind == 'minimum':
+        return minimum(frequencies, data)
+    if kind == 'edges':
+        if level is None:
+            level = analysis.logmag(data).max() - 3
+        return edges(frequencies, data, level)
+    if kind == 'phase':
+        return phase_zeros(frequencies, data)
+    if kind == 'resonance':
+        return resonances(frequencies, data)
+    raise AttributeError(f'Feature should be one of {KINDS}')
+
+
+def _scan(vna: NanoVNA, start, stop, points, array) -> (np.array, np.array):
+    start, stop = int(round(start)), int(round(stop))
+    vna.set_scan(start, stop, points)
+    return vna.frequency_axis(start, stop, points), vna.get_data(array)
+
+
+def refine(vna: NanoVNA, start, stop, features=('minimum',), array=0, points=NanoVNA.SEGMENT_POINTS, window_points=51,
+           resolution=1e3, iterations=6) -> Refinement:
+    """
+    Scans the span coarsely and then windows of window_points around each feature, 4 point spacings wide, until the
+    spacing is at most resolution Hz or the iterations run out. The device is resumed at the end.
+
+    :param features: Kinds of the features to refine, see KINDS
+    :param array: Data array to scan, 0 for S11 and 1 for S21
+    :param points: Points of the coarse scan
+    """
+    if not 5 <= window_points <= NanoVNA.SEGMENT_POINTS or not 2 <= points <= NanoVNA.SEGMENT_POINTS:
+        raise AttributeError(f'The scans should have from 5 to {NanoVNA.SEGMENT_POINTS} points')
+    for kind in features:
+        if kind not in KINDS:
+            raise AttributeError(f'Feature should be one of {KINDS}')
+
+    sweep = vna.sweep
+    found = []
+    try:
+        frequencies, data = _scan(vna, start, stop, points, array)
+        scans = [(frequencies, data)]
+        level = analysis.logmag(data).max() - 3  # the edges are relative to the peak of the whole span
+        for kind in features:
+            for frequency in locate(kind, frequencies, data, level):
+                step = frequencies[1] - frequencies[0]
+                window = scans[0]
+                for _ in range(iterations):
+                    if step <= resolution:
+                        break
+                    low, high = max(start, frequency - 2 * step), min(stop, frequency + 2 * step)
+                    window = _scan(vna, low, high, window_points, array)
+                    scans.append(window)
+                    step = (high - low) / (window_points - 1)
+                    located = locate(kind, *window, level)
+                    if len(located) == 0:
+                        break  # lost in the noise, keep the previous estimate
+                    frequency = located[np.abs(located - frequency).argmin()]
+                f, d = window
+                value = np.interp(frequency, f, d.real) + 1j * np.interp(frequency, f, d.imag)
+                found.append(Feature(kind, float(frequency), complex(value)))
+    finally:
+        vna.set_sweep(*sweep)
+        vna.resume()
+
+    merged_frequencies = np.concatenate([f for f, _ in scans])
+    merged_data = np.concatenate([d for _, d in scans])
+    merged_frequencies, first = np.unique(merged_frequencies, return_index=True)
+    return Refinement(merged_frequencies, merged_data[first], found)
@@ -0,0 +1,286 @@
+# Software NanoVNA, that speaks the same shell protocol as the device. It can be handed to NanoVNA as the serial object,
+# or served on a pty for anything that wants to open a tty path:
+#
+#   vna = nanovna.NanoVNA(dev=SimulatedNanoVNA())
+#   vna = nanovna.NanoVNA(dev=serve_pty(SimulatedNanoVNA()))
+
+import os
+import threading
+import time
+import tty
+
+import numpy as np
+
+INFO = [
+    'NanoVNA',
+    '2016-2020 Copyright @edy555',
+    'Licensed under GPL. See: https://github.com/ttrftech/NanoVNA',
+    'Version: 0.8.0 (simulated)',
+    'Build Time: Jun 19 2020 - 23:16:02',
+    'Kernel: 4.0.0',
+    'Architecture: ARMv6-M Core Variant: Cortex-M0',
+    'Platform: STM32F072xB Entry Level Medium Density devices',
+]
+
+
+TRACES = ('0', '1', '2', '3', 'all')
+TRACE_FORMATS = ('logmag', 'phase', 'delay', 'smith', 'polar', 'linear', 'swr', 'real', 'imag', 'r', 'x', 'q', 'off')
+
+
+class ResonantAntenna:
+    """
+    Series RLC model of an antenna, resonant at 446 MHz by default. S21 is a matched attenuator with a cable delay.
+    Like on the device, every sweep has a little noise, so consecutive sweeps can be told apart.
+    """
+
+    def __init__(self, resonance=446.1e6, q=25, resistance=45, z0=50, attenuation_db=6, delay=2e-9, noise=1e-4):
+        omega = 2 * np.pi * resonance
+        self.resistance = resistance
+        self.inductance = q * resistance / omega
+        self.capacitance = 1 / (omega ** 2 * self.inductance)
+        self.z0 = z0
+        self.gain = 10 ** (-attenuation_db / 20)
+        self.delay = delay
+        self.noise = noise
+        self._random = np.random.default_rng(0)
+
+    def _noise(self, shape):
+        if not self.noise:
+            return 0
+        return self.noise * (self._random.standard_normal(shape) + 1j * self._random.standard_normal(shape))
+
+    def s11(self, frequencies) -> np.array:
+        omega = 2 * np.pi * frequencies
+        z = self.resistance + 1j * (omega * self.inductance - 1 / (omega * self.capacitance))
+        return (z - self.z0) / (z + self.z0) + self._noise(frequencies.shape)
+
+    def s21(self, frequencies) -> np.array:
+        return self.gain * np.exp(-2j * np.pi * frequencies * self.delay) + self._noise(frequencies.shape)
+
+    def error_term(self, array, frequencies) -> np.array:
+        # small directivity and source match, lossy tracking with the delay of the test cables and a bit of leakage
+        # the transmission tracking is stored inverted, 1 / (S21thru - Ex), like the firmware does
+        magnitude, delay = {2: (0.01, 1e-9), 3: (0.02, 2e-9), 4: (0.95, 0.4e-9), 5: (0.9, 0.6e-9), 6: (0.001, 0)}[array]
+        term = magnitude * np.exp(-2j * np.pi * frequencies * delay)
+        return 1 / term if array == 5 else term
+
+
+class SimulatedNanoVNA:
+    """
+    Serial-like object answering the shell commands: echo, '\\r\\n', the output and the 'ch> ' prompt.
+
+    byte_latency models the link speed, the output is made available to read one byte per byte_latency seconds.
+    command_latency is added before the output of each command, like the device being busy sweeping.
+
+    Like the device, the data is frozen while paused, and every read of a sweeping device is a new noisy sweep.
+    Reading more than has been answered raises TimeoutError, where a serial port would block forever.
+    """
+    PROMPT = b'ch> '
+
+    def __init__(self, model=None, start=50000, stop=900000000, points=101, byte_latency=0.0, command_latency=0.0):
+        self.model = model or ResonantAntenna()
+        self._defaults = (int(start), int(stop), int(points))
+        self.start, self.stop, self.points = self._defaults
+        self.byte_latency = byte_latency
+        self.command_latency = command_latency
+        self.paused = False
+        self.calibrated = True
+        self.is_open = True
+        self.timeout = None
+        self.commands = 0
+        self._input = bytearray()
+        self._output = bytearray()
+        self._stream_start = 0.0
+        self._frame = None
+        self._frozen = {}  # data output by array number while paused
+
+    @property
+    def frequencies(self) -> np.array:
+        return np.rint(np.linspace(self.start, self.stop, self.points))
+
+    def _available(self, now) -> int:
+        if now < self._stream_start:
+            return 0
+        if not self.byte_latency:
+            return len(self._output)
+        return min(len(self._output), int((now - self._stream_start) / self.byte_latency))
+
+    @property
+    def in_waiting(self) -> int:
+        return self._available(time.perf_counter())
+
+    def read(self, size=1) -> bytes:
+        if size > len(self._output):
+            raise TimeoutError(f'Reading {size} bytes with {len(self._output)} bytes of output pending, '
+                               f'the device would never answer')
+        ready = self._stream_start + size * self.byte_latency
+        delay = ready - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        data = bytes(self._output[:size])
+        del self._output[:size]
+        self._stream_start = max(self._stream_start, ready)
+        return data
+
+    def write(self, data) -> int:
+        self._input += data
+        while True:
+            end = self._input.find(b'\r')
+            if end < 0:
+                break
+            line = self._input[:end].decode().strip()
+            del self._input[:end + 1]
+            self._respond(line)
+        return len(data)
+
+    def _respond(self, line):
+        if not self._output:
+            self._stream_start = time.perf_counter() + self.command_latency
+        self.commands += 1
+        self._output += line.encode() + b'\r\n'
+        if line:
+            name, *args = line.split()
+            handler = getattr(self, '_cmd_' + name, None)
+            if handler is None:
+                self._output += name.encode() + b'?\r\n'
+            else:
+                self._output += handler(*args)
+        self._output += self.PROMPT
+
+    @staticmethod
+    def _lines(lines) -> bytes:
+        return ''.join(f'{line}\r\n' for line in lines).encode()
+
+    def _cmd_info(self) -> bytes:
+        return self._lines(INFO)
+
+    def _cmd_version(self) -> bytes:
+        return self._lines(['0.8.0'])
+
+    def _cmd_pause(self) -> bytes:
+        self.paused = True
+        return b''
+
+    def _cmd_resume(self) -> bytes:
+        self.paused = False
+        self._frozen.clear()
+        return b''
+
+    def _cmd_reset(self) -> bytes:
+        # the device reboots, forgetting the sweep, and greets with the shell banner
+        self.start, self.stop, self.points = self._defaults
+        self.paused = False
+        self.calibrated = True
+        self._frozen.clear()
+        return b'\r\nNanoVNA Shell\r\n'
+
+    def _cmd_sweep(self, *args) -> bytes:
+        if not args:
+            return self._lines([f'{self.start} {self.stop} {self.points}'])
+        return self._set_range(*args)
+
+    def _cmd_scan(self, *args) -> bytes:
+        if len(args) < 2:
+            return self._lines(['usage: scan {start(Hz)} {stop(Hz)} [points]'])
+        output = self._set_range(*args)
+        if not output:
+            self.paused = True  # after a fresh sweep
+        return output
+
+    def _set_range(self, start, stop=None, points=None) -> bytes:
+        start = int(float(start))
+        stop = int(float(stop)) if stop is not None else self.stop
+        points = int(points) if points is not None else self.points
+        if not 0 < start <= stop or points < 1:
+            return self._lines(['frequency range is invalid'])
+        self._frozen.clear()
+        self.start, self.stop, self.points = start, stop, points
+        return b''
+
+    def _cmd_frequencies(self) -> bytes:
+        return self._lines('%d' % f for f in self.frequencies)
+
+    def _cmd_data(self, array='0') -> bytes:
+        array = int(array)
+        if array in self._frozen:
+            return self._frozen[array]
+        output = self._data(array)
+        if self.paused:
+            self._frozen[array] = output
+        return output
+
+    def _data(self, array) -> bytes:
+        frequencies = self.frequencies
+        if array == 0:
+            values = self.model.s11(frequencies)
+            if not self.calibrated:
+                ed, es, er = (self.model.error_term(n, frequencies) for n in (2, 3, 4))
+                values = ed + er * values / (1 - es * values)
+        elif array == 1:
+            values = self.model.s21(frequencies)
+            if not self.calibrated:
+                # the through path is tracked and loaded by the source match, S21a = (S21m - Ex) Et (1 - Es S11a)
+                es, et, ex = (self.model.error_term(n, frequencies) for n in (3, 5, 6))
+                values = ex + values / (et * (1 - es * self.model.s11(frequencies)))
+        elif 2 <= array <= 6:
+            values = self.model.error_term(array, frequencies)
+        else:
+            return self._lines(['usage: data [array]'])
+        return self._lines('%.9f %.9f' % (v.real, v.imag) for v in values)
+
+    def _cmd_trace(self, *args) -> bytes:
+        if args and (args[0] not in TRACES or len(args) > 1 and args[1] not in TRACE_FORMATS + ('scale', 'refpos')):
+            return self._lines(['trace {0|1|2|3|all} [%s] [src]' % '|'.join(TRACE_FORMATS)])
+        return b''
+
+    def _cmd_marker(self, *args) -> bytes:
+        if args and (args[0] not in ('1', '2', '3', '4') or len(args) > 1 and args[1] not in ('on', 'off')
+                     and not args[1].isdigit()):
+            return self._lines(['marker [n] [on|off|{index}]'])
+        return b''
+
+    def _cmd_cal(self, *args) -> bytes:
+        if args and args[0] in ('on', 'off'):
+            self.calibrated = args[0] == 'on'
+            self._frozen.clear()
+        return b''
+
+    def _cmd_capture(self) -> bytes:
+        if self._frame is None:
+            # RGB565 gradient, red over x and green over y
+            x = np.arange(320, dtype=np.uint16) * 32 // 320
+            y = np.arange(240, dtype=np.uint16)[:, None] * 64 // 240
+            self._frame = ((x << 11) | (y << 5)).astype('>u2').tobytes()
+        return self._frame
+
+    def reset_input_buffer(self):
+        self._output.clear()
+
+    def reset_output_buffer(self):
+        self._input.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def serve_pty(simulator) -> str:
+    """
+    Serves the simulator on a pseudo terminal from a daemon thread.
+
+    :return: Path of the tty to open
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+
+    def serve():
+        while True:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            simulator.write(data)
+            while simulator._output:
+                os.write(master, simulator.read(max(1, simulator.in_waiting)))
+
+    threading.Thread(target=serve, name='nanovna-simulator', daemon=True).start()
+    return os.ttyname(slave)
@@ -0,0 +1,59 @@
+class DeviceState:
+    """
+    Last known configuration of the device, as set or queried through the driver. None means unknown.
+
+    The cache doesn't see changes made on the touch screen, so it is cleared on every reconnect and reset, and
+    NanoVNA skips the redundant commands based on it only when asked to.
+    """
+
+    def __init__(self):
+        self.sweep = None  # (start, stop, points)
+        self._frequencies = None
+        self.traces = {}  # trace number: (format, channel)
+        self.markers = {}  # marker number: on, off or index
+
+    def clear(self):
+        self.__init__()
+
+    def set_sweep(self, start, stop, points):
+        sweep = int(start), int(stop), int(points)
+        if sweep != self.sweep:
+            self.sweep = sweep
+            self._frequencies = None
+
+    @property
+    def frequencies(self):
+        """
+        The frequency axis of the current sweep, None when not known.
+        """
+        return self._frequencies
+
+    @frequencies.setter
+    def frequencies(self, frequencies):
+        self._frequencies = frequencies
+        if frequencies is not None:
+            self.sweep = int(frequencies[0]), int(frequencies[-1]), len(frequencies)
+
+    def changes_trace(self, trace, trace_format, channel) -> bool:
+        """
+        :return: True if setting the trace would change the known state
+        """
+        traces = range(4) if trace == 'all' else [int(trace)]
+        return any(self.traces.get(t) != (trace_format, channel) for t in traces)
+
+    def set_trace(self, trace, trace_format, channel) -> bool:
+        """
+        :return: True if this changes the known state
+        """
+        changed = self.changes_trace(trace, trace_format, channel)
+        for t in range(4) if trace == 'all' else [int(trace)]:
+            self.traces[t] = (trace_format, channel)
+        return changed
+
+    def changes_marker(self, n, value) -> bool:
+        return self.markers.get(n) != str(value)
+
+    def set_marker(self, n, value) -> bool:
+        changed = self.changes_marker(n, value)
+        self.markers[n] = str(value)
+        return changed
@@ -0,0 +1,139 @@
+# Touchstone (.s1p/.s2p) writing and reading without scikit-rf.
+#
+# The values are formatted with one string formatting pass over the whole sweep, using a template built once per
+# sweep size, instead of formatting every value in Python. Reading parses the whole data section in one numpy pass.
+# The NanoVNA measures only S11 and S21, so the .s2p files have zeros for S12 and S22.
+
+import os
+
+import numpy as np
+
+FORMATS = ('RI', 'MA', 'DB')
+UNITS = {'HZ': 1, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+
+
+def _columns(s, fmt) -> (np.array, np.array):
+    if fmt == 'RI':
+        return s.real, s.imag
+    magnitude = np.abs(s)
+    if fmt == 'DB':
+        with np.errstate(divide='ignore'):
+            magnitude = np.maximum(20 * np.log10(magnitude), -300)  # zero as near -inf dB, like S12 and S22
+    return magnitude, np.angle(s, deg=True)
+
+
+def _complex(first, second, fmt) -> np.array:
+    if fmt == 'RI':
+        return first + 1j * second
+    magnitude = 10 ** (first / 20) if fmt == 'DB' else first
+    return magnitude * np.exp(1j * np.deg2rad(second))
+
+
+class TouchstoneWriter:
+    """
+    Writes sweeps of the same frequency axis as numbered Touchstone files {directory}/{prefix}-{n}.s1p or .s2p.
+    """
+
+    def __init__(self, directory, prefix, frequencies, two_port=False, fmt='RI', z0=50, comments=()):
+        if fmt not in FORMATS:
+            raise AttributeError(f'Format should be one of {FORMATS}')
+        if not os.path.isdir(directory):
+            raise AttributeError(f'{directory} is not a directory')
+        self.directory = directory
+        self.prefix = prefix
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+        self.two_port = two_port
+        self.fmt = fmt
+        self.count = 0
+        ports = 2 if two_port else 1
+        self._header = ''.join(f'! {line}\n' for line in comments) + f'# HZ S {fmt} R {z0:g}\n'
+        self._table = np.zeros((len(self.frequencies), 1 + 2 * ports * ports))
+        self._table[:, 0] = self.frequencies
+        if two_port and fmt == 'DB':
+            self._table[:, 5] = self._table[:, 7] = -300  # zero S12 and S22 as near -inf dB
+        self._template = ('%.0f' + ' %.9g' * (self._table.shape[1] - 1) + '\n') * len(self.frequencies)
+        self.extension = '.s2p' if two_port else '.s1p'
+
+    def format(self, s11, s21=None) -> str:
+        """
+        :return: Touchstone text of one sweep
+        """
+        self._table[:, 1], self._table[:, 2] = _columns(np.asarray(s11), self.fmt)
+        if self.two_port:
+            self._table[:, 3], self._table[:, 4] = _columns(np.asarray(s21), self.fmt)
+        return self._header + self._template % tuple(self._table.ravel())
+
+    def write(self, s11, s21=None, path=None) -> str:
+        """
+        Writes one sweep, to the next numbered file unless path is given.
+
+        :return: Path of the file
+        """
+        if path is None:
+            path = f'{self.directory}/{self.prefix}-{self.count:06d}{self.extension}'
+        with open(path, 'w') as f:
+            f.write(self.format(s11, s21))
+        self.count += 1
+        return path
+
+    def write_many(self, s11, s21=None) -> [str]:
+        """
+        Writes each row of the sweeps x points arrays to its own file.
+        """
+        return [self.write(s11[i], None if s21 is None else s21[i]) for i in range(len(s11))]
+
+
+def write_touchstone(path, frequencies, s11, s21=None, fmt='RI', z0=50, comments=()):
+    """
+    Writes one sweep, as .s2p when s21 is given.
+    """
+    writer = TouchstoneWriter(os.path.dirname(path) or '.', '', frequencies, s21 is not None, fmt, z0, comments)
+    writer.write(s11, s21, path)
+
+
+def read_touchstone(path, out=None, frequencies_out=None) -> (np.array, np.array, float):
+    """
+    Reads a .s1p or .s2p file in any of the RI, MA or DB formats and frequency units.
+
+    :param out: Optional complex array to fill, points for .s1p, or points x 4 (S11, S21, S12, S22) for .s2p
+    :param frequencies_out: Optional float array of points to fill with the frequencies in Hz
+    :return: frequencies in Hz, S-parameters, reference impedance
+    """
+    path = os.fspath(path)
+    with open(path, 'rb') as f:
+        text = f.read()
+    unit, fmt, z0 = 'GHZ', 'MA', 50.0  # defaults of the specification
+    data = []
+    for line in text.split(b'\n'):
+        line = line.split(b'!', 1)[0]
+        if line.startswith(b'#'):
+            options = line[1:].upper().split()
+            for i, option in enumerate(options):
+                option = option.decode()
+                if option in UNITS:
+                    unit = option
+                elif option in FORMATS:
+                    fmt = option
+                elif option == 'R':
+                    z0 = float(options[i + 1])
+        elif line.strip():
+            data.append(line)
+
+    values = np.fromstring(b' '.join(data), dtype=np.float64, sep=' ')
+    columns = 9 if path.lower().endswith('.s2p') else 3
+    # older numpy stops at unparsable text with only a DeprecationWarning, so the count is checked against the lines
+    if values.size != columns * len(data):
+        raise ValueError(f'{path} has {values.size} values on {len(data)} lines, expected {columns} per line')
+    table = values.reshape(-1, columns)
+
+    frequencies = table[:, 0] * UNITS[unit]
+    if frequencies_out is not None:
+        frequencies_out[:] = frequencies
+        frequencies = frequencies_out
+    s = _complex(table[:, 1::2], table[:, 2::2], fmt)
+    if columns == 3:
+        s = s[:, 0]
+    if out is not None:
+        out[:] = s
+        s = out
+    return frequencies, s, z0
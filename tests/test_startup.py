@@ -0,0 +1,28 @@
+# The package and the CLI are imported by every `nanovna` command, the heavy modules should only be imported by the
+# subcommands that use them.
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('numpy', 'serial', 'PIL', 'matplotlib', 'asyncio')
+
+
+def _imported(code) -> set:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    output = subprocess.run([sys.executable, '-c', f'{code}\nimport json, sys\nprint(json.dumps(list(sys.modules)))'],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return {name.split('.')[0] for name in json.loads(output)}
+
+
+@pytest.mark.parametrize('code', [
+    'import nanovna',
+    'import nanovna.cli',
+    'import nanovna.cli; nanovna.cli.parser().parse_args(["info"])',
+])
+def test_no_heavy_imports(code):
+    assert not _imported(code) & set(HEAVY)